@@ -1,76 +1,51 @@
-import os
-import time
+import sys
 
 import carla
-import numpy as np
-import pandas as pd
-import pygame
 
+from actor_state import capture_states
+from camera_sink import FrameRing, LatestFrame, PygameView
+from control_schedule import ControlSchedule
+from metrics_recorder import MetricsRecorder
+from metrics_sink import open_sink
 from scenario_descriptor import ScenarioDescription as sc
+from traffic_lights import TrafficLightController
 
 CAMERA_WIDTH = 1280
 CAMERA_HEIGHT = 720
+# batch runs skip pygame and stop on their own after HEADLESS_STEPS ticks
+HEADLESS = '--headless' in sys.argv
+HEADLESS_STEPS = 400
 
 # Pygame Setup
-pygame.init()
-screen = pygame.display.set_mode((CAMERA_WIDTH, CAMERA_HEIGHT))
+view = FrameRing() if HEADLESS else PygameView(CAMERA_WIDTH, CAMERA_HEIGHT)
+latest_frame = LatestFrame()
 
 actor_list = []
-metrics_df = pd.DataFrame(
-    columns=['actor_type', 'sumo_id', 'velocity', 'travelled_distance', 'throttle', 'steer', 'brake', 'acceleration',
-             'acc_x', 'acc_y', 'loc_x', 'loc_y', 'heading', 'time_step', 'time'])
-
-
-def visualize_image(image):
-    image.convert(carla.ColorConverter.Raw)
-    array = np.frombuffer(image.raw_data, dtype=np.dtype("uint8"))
-    array = np.reshape(array, (image.height, image.width, 4))
-    array = array[:, :, :3]
-    array = array[:, :, ::-1]
-    surface = pygame.surfarray.make_surface(array.swapaxes(0, 1))
-    screen.blit(surface, (0, 0))
-
-
-def log_metrics(path: str = None, last_tick=False):
-    global metrics_df
-    if path is None:
-        path = os.getcwd()
-    path = os.path.join(path, 'logs')
-    if not os.path.exists(path):
-        os.mkdir(path)
-    filepath = os.path.join(path, f'logged_metrics_{time.time()}.csv')
-    for ac in actor_list:
-        sc_actor = [sc_ac for sc_ac in sc.all_actor if sc_ac.type == ac.type_id][0]
-        actor_type = ac.type_id
-        sumo_id = sc_actor.sumo_id
-        vel = ac.get_velocity().length()
-        time_step = world.get_snapshot().timestamp.delta_seconds
-        travelled_dis = vel * time_step
-        time_val = 0.0
-        try:
-            type_df = metrics_df.loc[metrics_df['actor_type'] == ac.type_id]
-            travelled_dis = travelled_dis + type_df.iloc[-1, 3]
-            time_val = time_step + metrics_df.iloc[-1, -1]
-        except IndexError:
-            pass
-        control = ac.get_control()
-        throttle = control.throttle
-        steer = control.steer
-        brake = control.brake
-        acc_x = ac.get_acceleration().x
-        acc_y = ac.get_acceleration().y
-        acceleration = (acc_x ** 2 + acc_y ** 2) ** (1 / 2)
-        loc_x = ac.get_location().x
-        loc_y = ac.get_location().y
-        heading = ac.get_transform().rotation.yaw
-        new_row = {'actor_type': actor_type, 'sumo_id': sumo_id, 'velocity': vel, 'travelled_distance': travelled_dis,
-                   'throttle': throttle, 'steer': steer, 'brake': brake, 'acceleration': acceleration, 'acc_x': acc_x,
-                   'acc_y': acc_y, 'loc_x': loc_x, 'loc_y': loc_y, 'heading': heading, 'time_step': time_step,
-                   'time': time_val}
-        metrics_df = metrics_df.append(new_row, ignore_index=True)
-
-        if last_tick:
-            metrics_df.to_csv(filepath, index=False)
+camera = None
+traffic_lights = None
+recorder = MetricsRecorder(sink=open_sink(), flush_every=100, scenario=sc.name)
+sumo_ids = {actor.type: actor.sumo_id for actor in sc.all_actor}
+
+
+def log_metrics(time_step: float, states: list, last_tick=False):
+    for state in states:
+        recorder.record(
+            actor_type=state.actor.type_id,
+            sumo_id=sumo_ids[state.actor.type_id],
+            velocity=state.velocity.length(),
+            throttle=state.control.throttle,
+            steer=state.control.steer,
+            brake=state.control.brake,
+            acc_x=state.acceleration.x,
+            acc_y=state.acceleration.y,
+            loc_x=state.transform.location.x,
+            loc_y=state.transform.location.y,
+            heading=state.transform.rotation.yaw,
+            time_step=time_step)
+    recorder.tick()
+
+    if last_tick:
+        recorder.close()
 
 
 try:
@@ -92,15 +67,17 @@ try:
     # Ego vehicle with camera attached to it's back
 
     vehicle_bp = blueprint_library.find(sc.ego_actor.type)
-    camera_bp = blueprint_library.find('sensor.camera.rgb')
-    camera_bp.set_attribute('image_size_x', str(CAMERA_WIDTH))
-    camera_bp.set_attribute('image_size_y', str(CAMERA_HEIGHT))
     ego_vehicle_location = carla.Transform(carla.Location(*sc.ego_actor.pos), carla.Rotation(*sc.ego_actor.rot))
     ego_vehicle = world.try_spawn_actor(vehicle_bp, ego_vehicle_location)
     ego_vehicle.apply_control(carla.VehicleControl(*sc.ego_actor.control))
-    camera_relative_loc = carla.Transform(carla.Location(*sc.ego_actor.sens_rel_loc), carla.Rotation(pitch=-15))
-    camera = world.spawn_actor(camera_bp, camera_relative_loc, attach_to=ego_vehicle)
-    camera.listen(lambda data: visualize_image(data))
+    # headless runs without a frame ring do not spawn the camera, so the server renders no frames
+    if view.wants_frames:
+        camera_bp = blueprint_library.find('sensor.camera.rgb')
+        camera_bp.set_attribute('image_size_x', str(CAMERA_WIDTH))
+        camera_bp.set_attribute('image_size_y', str(CAMERA_HEIGHT))
+        camera_relative_loc = carla.Transform(carla.Location(*sc.ego_actor.sens_rel_loc), carla.Rotation(pitch=-15))
+        camera = world.spawn_actor(camera_bp, camera_relative_loc, attach_to=ego_vehicle)
+        camera.listen(latest_frame.put)
     actor_list.append(ego_vehicle)
 
     for actor in sc.other_actors:
@@ -109,6 +86,8 @@ try:
         vehicle = world.try_spawn_actor(vehicle_bp, vehicle_location)
         vehicle.apply_control(carla.VehicleControl(*actor.control))
         actor_list.append(vehicle)
+    vehicles = {actor.sumo_id: vehicle for actor, vehicle in zip(sc.all_actor, actor_list)}
+    control_schedule = ControlSchedule(sc.control_schedules.get('carla', ()))
 
     world.tick()
 
@@ -118,50 +97,43 @@ try:
         carla.Location(x=-445.9, y=24.23, z=44.5), carla.Rotation(pitch=-47.0, yaw=0.0, roll=0.0))
     spectator.set_transform(spectator_location)
 
+    traffic_lights = TrafficLightController(world)
+
     running = True
-    screen.fill((0, 0, 0))
-    pygame.display.flip()
 
     distance = 0.0
+    step = 0
     while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
+        if view.quit_requested() or (HEADLESS and step == HEADLESS_STEPS):
+            running = False
         world.tick()
-        current_location = ego_vehicle.get_transform().location
+        # one snapshot per tick, the ego is the first entry of actor_list
+        time_step, states = capture_states(world, actor_list)
+        current_location = states[0].transform.location
         distance += ego_vehicle_location.location.distance(current_location)
         ego_vehicle_location.location = current_location
 
         # set Traffic Lights
-        actors = world.get_actors().filter('traffic.traffic_light')
-        for actor in actors:
-            state = carla.TrafficLightState.Red
-            light_dis = actor.get_location().distance(current_location)
-            if light_dis < 55:
-                state = carla.TrafficLightState.Yellow
-            if light_dis < 45:
-                state = carla.TrafficLightState.Green
-            actor.set_state(state)
-
-        if distance > 20:
-            ego_vehicle.apply_control(carla.VehicleControl(brake=0.2, steer=0.0))
-            [a for a in actor_list if a.type_id == 'vehicle.audi.a2'][0].apply_control(
-                carla.VehicleControl(throttle=1.0, steer=0.0))
-        if distance > 34:
-            ego_vehicle.apply_control(carla.VehicleControl(throttle=1.0, steer=-0.3))
-        if distance > 67:
-            ego_vehicle.apply_control(carla.VehicleControl(throttle=4.0, steer=0.0))
-        if distance > 83:
-            ego_vehicle.apply_control(carla.VehicleControl(throttle=1.0, steer=0.07))
-        if distance > 87:
-            ego_vehicle.apply_control(carla.VehicleControl(throttle=1.0, steer=0.0))
-        pygame.display.flip()
-        log_metrics(last_tick=not running)
+        traffic_lights.update(current_location)
+
+        # scenario control schedule: one batch per tick at most, and only when a control changed
+        changes = control_schedule.update(distance)
+        if changes:
+            client.apply_batch([carla.command.ApplyVehicleControl(vehicles[actor].id, carla.VehicleControl(*control))
+                                for actor, control in changes])
+        # only the newest camera frame is drawn, stale ones were dropped by the sensor callback
+        view.render(latest_frame.take())
+        log_metrics(time_step, states, last_tick=not running)
+        step += 1
 
 finally:
+    recorder.close()
+    if traffic_lights is not None:
+        traffic_lights.release()
     world.apply_settings(default_settings)
     world.tick()
     for actor in actor_list:
         actor.destroy()
-    camera.destroy()
-    pygame.quit()
+    if camera is not None:
+        camera.destroy()
+    view.close()
@@ -3,9 +3,11 @@ from __future__ import print_function
 
 import os
 import sys
+import numpy as np
 import pandas as pd
-import plotly.express as px
 
+from log_catalog import LogCatalog
+from report import metrics_report, render_sections, write_report
 from scenario_descriptor import ScenarioDescription as sc
 from scenario_descriptor import conv2sumoLoc
 
@@ -18,82 +20,90 @@ else:
 
 from sumolib import checkBinary  # noqa
 import traci  # noqa
+from traci import constants as tc  # noqa
+from road_index import RoadIndex  # noqa
+
+REPLAY_COLUMNS = ['speed', 'x', 'y', 'heading', 'time']
+# spacing of the time column of sumo_logged.csv
+LOGGED_TIME_STEP = 0.115
+MAX_REPLAY_STEPS = 1000
+
 
 def extract_speed_values(df:pd.DataFrame,actors:list)->dict:
-    speed_dict = {}
-    for actor in actors:
-        sumo_id = actor.sumo_id
-        sumo_type_df = df.loc[df['sumo_id']==sumo_id]
-        velocities = sumo_type_df['velocity'].tolist()
-        speed_dict.update({actor.sumo_id:velocities})
-    return speed_dict
+    # one grouping pass over the log, every actor's velocities as a NumPy profile
+    velocities = df.groupby('sumo_id', sort=False)['velocity']
+    return {actor.sumo_id: velocities.get_group(actor.sumo_id).to_numpy(dtype=float)
+            if actor.sumo_id in velocities.groups else np.empty(0)
+            for actor in actors}
+
+
+def replay(speeds: dict, ego_id: str, max_steps: int = MAX_REPLAY_STEPS) -> pd.DataFrame:
+    """
+    Step SUMO while injecting the logged speeds until the shortest profile is used up.
+    The ego state comes from one subscription pushed with every step and is written into
+    preallocated rows; setSpeed is only sent for vehicles whose target speed changed.
+    """
+    sumo_ids = list(speeds)
+    steps = min(len(profile) for profile in speeds.values())
+    profiles = np.array([speeds[sumo_id][:steps] for sumo_id in sumo_ids]).reshape(len(sumo_ids), steps)
+    traci.vehicle.subscribe(ego_id, [tc.VAR_SPEED, tc.VAR_POSITION, tc.VAR_ANGLE])
+
+    rows = np.empty((min(steps + 1, max_steps), len(REPLAY_COLUMNS)))
+    last_target = np.full(len(sumo_ids), np.nan)
+    for step in range(len(rows)):
+        traci.simulationStep()
+        state = traci.vehicle.getSubscriptionResults(ego_id)
+        if not state:
+            # the ego has left the simulation
+            rows = rows[:step]
+            break
+        x, y = state[tc.VAR_POSITION]
+        rows[step] = state[tc.VAR_SPEED], x, y, state[tc.VAR_ANGLE], step * LOGGED_TIME_STEP
+        if step < steps:
+            target = profiles[:, step]
+            for idx in np.flatnonzero(target != last_target):
+                traci.vehicle.setSpeed(sumo_ids[idx], float(target[idx]))
+            last_target = target
+    return pd.DataFrame(rows, columns=REPLAY_COLUMNS)
 
 def save_plots(df:pd.DataFrame)->None:
+    # one report with a section per actor instead of an HTML file per column and actor
+    metrics_report(df, './figs/report.html')
 
-    act_types = df['actor_type'].tolist()[0:8]
-    # for col in df.columns:
-    #     for act_type in act_types:
-    #         df_type = df.loc[df['actor_type']==act_type]
-    #         fig = px.line(df_type,x='time',y=col,title = act_type)
-    #         fig.write_html(f'./figs/{col}__{act_type}.html')
-    for act_type in act_types:
-        df_type = df.loc[df['actor_type']==act_type]
-        fig = px.line(df_type,x='loc_x',y='loc_y',title = f'Trajectory {act_type}')
-        fig.write_html(f'./figs/Trajectory__{act_type}.html')
-def run():
-    step = 0
+def run(road_index: RoadIndex):
     vehic_num = 0
-    start_edge_ego, _, start_lane_ego = traci.simulation.convertRoad(*conv2sumoLoc(sc.ego_actor.pos))
-    des_edge_ego, _, des_lane_ego = traci.simulation.convertRoad(*conv2sumoLoc(sc.ego_actor.destination_pos))
+    start_edge_ego, _, start_lane_ego = road_index.convert_road(*conv2sumoLoc(sc.ego_actor.pos))
+    des_edge_ego, _, des_lane_ego = road_index.convert_road(*conv2sumoLoc(sc.ego_actor.destination_pos))
     traci.route.add(f'trip{vehic_num}', [f'{start_edge_ego}', f'{des_edge_ego}'])
     traci.vehicle.add(sc.ego_actor.sumo_id, f'trip{vehic_num}', typeID=sc.ego_actor.type.split('_')[0])
     traci.vehicle.moveToXY(sc.ego_actor.sumo_id, f'{start_edge_ego}', f'{start_lane_ego}',
                            *conv2sumoLoc(sc.ego_actor.pos), keepRoute=1)
     vehic_num += 1
     for actor in sc.other_actors:
-        start_edge_actor, _, start_lane_actor = traci.simulation.convertRoad(*conv2sumoLoc(actor.pos))
-        des_edge_actor, _, des_lane_actor = traci.simulation.convertRoad(*conv2sumoLoc(actor.destination_pos))
+        start_edge_actor, _, start_lane_actor = road_index.convert_road(*conv2sumoLoc(actor.pos))
+        des_edge_actor, _, des_lane_actor = road_index.convert_road(*conv2sumoLoc(actor.destination_pos))
         traci.route.add(f'trip{vehic_num}', [f'{start_edge_actor}', f'{des_edge_actor}'])
         traci.vehicle.add(actor.sumo_id, f'trip{vehic_num}', typeID=actor.type)
         traci.vehicle.moveToXY(actor.sumo_id, f'{start_edge_actor}', f'{start_lane_actor}',
                                *conv2sumoLoc(actor.pos), keepRoute=1)
         vehic_num += 1
-    path = os.path.join(os.getcwd(), 'logs')
-    df = None
-    for file in os.listdir(path):
-        filepath = os.path.join(path, file)
-        if os.path.isfile(filepath) and file.endswith('.csv'):
-            df = pd.read_csv(filepath)
-            break
-    if df is None:
-        raise Exception(f'No log (cvs) file found at {path}')
+    # newest logged run of this scenario, only the columns the replay needs
+    catalog = LogCatalog()
+    catalog.refresh()
+    run_id = catalog.latest(scenario=sc.name) or catalog.latest()
+    if run_id is None:
+        raise Exception(f'No logged run found at {catalog.logs_dir}')
+    df = catalog.read(run_id, columns=['sumo_id', 'velocity'])
     speeds = extract_speed_values(df,sc.all_actor)
     #save_plots(df)
-    sumo_df = pd.DataFrame(columns=['speed','x','y','heading','time'])
-    while step < 1000:
-        try:
-            traci.simulationStep()
-            s_speed = traci.vehicle.getSpeed('vehicle0')
-            s_trajectory = traci.vehicle.getPosition('vehicle0')
-            s_heading = traci.vehicle.getAngle('vehicle0')
-            try:
-                s_time = sumo_df.iloc[-1,-1] + 0.115
-            except:
-                s_time = 0
-            sumo_dict = {'speed':s_speed, 'x':s_trajectory[0],'y':s_trajectory[1], 'heading':s_heading,'time':s_time}
-            sumo_df = sumo_df.append(sumo_dict, ignore_index=True)
-            for sumo_id,vel in speeds.items():
-                traci.vehicle.setSpeed(sumo_id,vel[step])
-            step += 1
-        except:
-            figure = px.line(sumo_df, x='x', y='y',title='SUMO Trajectory ego')
-            figure.write_html('./sumo_trajectory.html')
-            figure = px.line(sumo_df, x='time', y='speed', title='SUMO velocity ego')
-            figure.write_html('./sumo_vel.html')
-            figure = px.line(sumo_df, x='time', y='heading', title='SUMO heading ego')
-            figure.write_html('./sumo_heading.html')
-            sumo_df.to_csv('./logs/sumo_logged.csv')
-            traci.close()
+    try:
+        sumo_df = replay(speeds, sc.ego_actor.sumo_id)
+    finally:
+        traci.close()
+    sumo_df.to_csv('./logs/sumo_logged.csv')
+    # trajectory, speed and heading of the ego in one report
+    sections = render_sections([('SUMO ego', sumo_df, 'time', ['speed', 'heading'], ('x', 'y'))])
+    write_report('./sumo_report.html', 'SUMO replay', [('SUMO ego', sections[0])])
 
 
 if __name__ == '__main__':
@@ -101,4 +111,5 @@ if __name__ == '__main__':
 
     traci.start([sumoBinary, '-c', 'D:\Carla_bullshit\WindowsNoEditor\Co-Simulation\Sumo\examples\Town04.sumocfg',
                  '--step-length', '0.023'])
-    run()
+    run(RoadIndex(r'D:\Carla_bullshit\WindowsNoEditor\Co-Simulation\Sumo\examples\net\Town04.net.xml',
+                  fallback=traci.simulation.convertRoad))
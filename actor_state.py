@@ -0,0 +1,25 @@
+from collections import namedtuple
+
+ActorState = namedtuple('ActorState',
+                        ['actor', 'transform', 'velocity', 'acceleration', 'angular_velocity', 'control'])
+
+
+def capture_states(world, actors: list) -> tuple:
+    """
+    Read the state of every actor from a single world snapshot of the current tick.
+    Only the vehicle control is fetched per actor. Returns (delta_seconds, [ActorState, ...]).
+    """
+    snapshot = world.get_snapshot()
+    states = []
+    for actor in actors:
+        actor_snapshot = snapshot.find(actor.id)
+        if actor_snapshot is None:
+            raise RuntimeError(f'Actor {actor.id} ({actor.type_id}) is missing from the world snapshot')
+        states.append(ActorState(
+            actor=actor,
+            transform=actor_snapshot.get_transform(),
+            velocity=actor_snapshot.get_velocity(),
+            acceleration=actor_snapshot.get_acceleration(),
+            angular_velocity=actor_snapshot.get_angular_velocity(),
+            control=actor.get_control()))
+    return snapshot.timestamp.delta_seconds, states
@@ -0,0 +1,119 @@
+import argparse
+import math
+import multiprocessing as mp
+import os
+import time
+from collections import namedtuple
+
+from tabulate import tabulate
+
+from control_schedule import ControlSchedule
+from metrics_recorder import MetricsRecorder
+from metrics_sink import open_sink
+from sim_backend import BACKEND_NAMES, get_backend
+
+Endpoint = namedtuple('Endpoint', ['host', 'port'])
+RunResult = namedtuple('RunResult', ['run_id', 'scenario', 'endpoint', 'ticks', 'wall_time', 'log_path'])
+
+_endpoint = None
+_road_index = None
+
+
+def make_endpoints(count: int, host: str = 'localhost', port: int = 2000) -> list:
+    # CARLA uses two consecutive ports per server, so instances are spread two ports apart
+    return [Endpoint(host, port + 2 * i) for i in range(count)]
+
+
+def _claim_endpoint(endpoints, net_file: str = None) -> None:
+    # every worker process owns one simulator endpoint for its whole life, and builds the road index once
+    global _endpoint, _road_index
+    _endpoint = endpoints.get()
+    if net_file is not None:
+        from road_index import RoadIndex
+        _road_index = RoadIndex(net_file)
+
+
+def run_scenario(run_id: int, scenario, endpoint: Endpoint, steps: int, out_dir: str, backend: str = 'kinematic',
+                 log_format: str = 'arrow', road_index=None) -> RunResult:
+    run_dir = os.path.join(out_dir, f'run{run_id}')
+    os.makedirs(run_dir, exist_ok=True)
+    sim = get_backend(backend)(endpoint, road_index=road_index)
+    recorder = MetricsRecorder(sink=open_sink(run_dir, log_format), scenario=scenario.name)
+    log_path = recorder.sink.filepath
+    # the stand-in replays the manoeuvre of the CARLA-only script
+    control_schedule = ControlSchedule(scenario.control_schedules.get('carla', ()))
+    start = time.perf_counter()
+    try:
+        handles = {actor.sumo_id: sim.spawn(actor) for actor in scenario.all_actor}
+        distance = 0.0
+        last_location = None
+        for _ in range(steps):
+            time_step = sim.tick()
+            states = sim.read_states()
+            ego = states[0]
+            if last_location is not None:
+                distance += math.hypot(ego['loc_x'] - last_location[0], ego['loc_y'] - last_location[1])
+            last_location = ego['loc_x'], ego['loc_y']
+            for actor, control in control_schedule.update(distance):
+                sim.apply_control(handles[actor], *control)
+            for state in states:
+                recorder.record(time_step=time_step, **state)
+            recorder.tick()
+    finally:
+        recorder.close()
+        sim.close()
+    return RunResult(run_id, scenario.name, endpoint, steps, time.perf_counter() - start, log_path)
+
+
+def _run_job(job) -> RunResult:
+    return run_scenario(job[0], job[1], _endpoint, *job[2:], road_index=_road_index)
+
+
+def run_batch(scenarios: list, endpoints: list, steps: int, out_dir: str, backend: str = 'kinematic',
+              log_format: str = 'arrow', net_file: str = None) -> list:
+    """
+    Run every scenario in its own job on a pool with one worker process per endpoint.
+    net_file is the SUMO net every worker builds its road_index.RoadIndex from, the CARLA backend needs one.
+    """
+    if backend == 'carla' and net_file is None:
+        raise ValueError('The carla backend needs the SUMO net file for its road index')
+    manager = mp.Manager()
+    queue = manager.Queue()
+    for endpoint in endpoints:
+        queue.put(endpoint)
+    jobs = [(run_id, scenario, steps, out_dir, backend, log_format) for run_id, scenario in enumerate(scenarios)]
+    with mp.Pool(len(endpoints), initializer=_claim_endpoint, initargs=(queue, net_file)) as pool:
+        results = sorted(pool.imap_unordered(_run_job, jobs), key=lambda result: result.run_id)
+    manager.shutdown()
+    return results
+
+
+def print_report(results: list, wall_time: float) -> None:
+    table = [["Run", "Scenario", "Endpoint", "Ticks", "Wall time [s]", "Ticks/s", "Log"]]
+    for result in results:
+        table.append([result.run_id, result.scenario, f'{result.endpoint.host}:{result.endpoint.port}',
+                      result.ticks, result.wall_time, result.ticks / result.wall_time, result.log_path])
+    print(tabulate(table, headers="firstrow"))
+    total_ticks = sum(result.ticks for result in results)
+    print(f'{len(results)} runs, {total_ticks} ticks in {wall_time:.2f} s ({total_ticks / wall_time:.1f} ticks/s)')
+
+
+if __name__ == '__main__':
+    from scenario_descriptor import SCENARIO_DIR, load_scenarios
+
+    parser = argparse.ArgumentParser(description='Run scenarios in parallel across simulator endpoints')
+    parser.add_argument('--scenarios', default=os.path.join(SCENARIO_DIR, 'u_turn.json'))
+    parser.add_argument('--runs', type=int, default=8, help='runs per scenario')
+    parser.add_argument('--endpoints', type=int, default=os.cpu_count())
+    parser.add_argument('--steps', type=int, default=400)
+    parser.add_argument('--backend', default='kinematic', choices=BACKEND_NAMES)
+    parser.add_argument('--out', default=os.path.join(os.getcwd(), 'batch'))
+    parser.add_argument('--net', help='SUMO net file for the road index, required by --backend carla')
+    args = parser.parse_args()
+    if args.backend == 'carla' and args.net is None:
+        parser.error('--backend carla needs --net')
+
+    start = time.perf_counter()
+    batch_results = run_batch(load_scenarios(args.scenarios) * args.runs, make_endpoints(args.endpoints), args.steps,
+                              args.out, args.backend, net_file=args.net)
+    print_report(batch_results, time.perf_counter() - start)
@@ -0,0 +1,85 @@
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class LatestFrame:
+    """
+    Single-slot frame buffer filled from the sensor callback thread. The main loop only renders the newest
+    frame, older frames that were never taken are dropped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._image = None
+        self.dropped = 0
+
+    def put(self, image) -> None:
+        with self._lock:
+            if self._image is not None:
+                self.dropped += 1
+            self._image = image
+
+    def take(self):
+        with self._lock:
+            image, self._image = self._image, None
+        return image
+
+
+def bgra_view(image) -> np.ndarray:
+    # (height, width, 4) view on the CARLA buffer, no copy
+    return np.frombuffer(image.raw_data, dtype=np.uint8).reshape((image.height, image.width, 4))
+
+
+def rgb_view(image) -> np.ndarray:
+    # BGRA -> RGB by striding over the same buffer, no copy
+    return bgra_view(image)[:, :, 2::-1]
+
+
+class PygameView:
+    wants_frames = True
+
+    def __init__(self, width: int, height: int):
+        import pygame
+
+        self.pygame = pygame
+        pygame.init()
+        self.screen = pygame.display.set_mode((width, height))
+        self.screen.fill((0, 0, 0))
+        pygame.display.flip()
+
+    def quit_requested(self) -> bool:
+        return any(event.type == self.pygame.QUIT for event in self.pygame.event.get())
+
+    def render(self, image) -> None:
+        if image is not None:
+            # pygame reads the BGRA buffer directly
+            surface = self.pygame.image.frombuffer(image.raw_data, (image.width, image.height), 'BGRA')
+            self.screen.blit(surface, (0, 0))
+        self.pygame.display.flip()
+
+    def close(self) -> None:
+        self.pygame.quit()
+
+
+class FrameRing:
+    """Headless view that keeps the last `size` frames as RGB arrays, or nothing when size is 0."""
+
+    def __init__(self, size: int = 0):
+        self.frames = deque(maxlen=size)
+
+    @property
+    def wants_frames(self) -> bool:
+        # without a ring buffer no camera is needed at all, so the server does not render one
+        return bool(self.frames.maxlen)
+
+    def quit_requested(self) -> bool:
+        return False
+
+    def render(self, image) -> None:
+        if image is not None and self.frames.maxlen:
+            self.frames.append(np.ascontiguousarray(rgb_view(image)))
+
+    def close(self) -> None:
+        pass
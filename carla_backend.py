@@ -0,0 +1,68 @@
+import carla
+
+from actor_state import capture_states
+from sim_backend import SimulatorBackend
+
+
+class CarlaBackend(SimulatorBackend):
+    """
+    SimulatorBackend on a live CARLA server in synchronous mode, reading state through world snapshots.
+    CARLA has no convertRoad, so a road_index.RoadIndex of the SUMO net is required.
+    """
+
+    def __init__(self, endpoint=None, step_length: float = 0.023, town: str = 'Town04', road_index=None):
+        if road_index is None:
+            raise ValueError('CarlaBackend needs a road_index.RoadIndex, CARLA has no convertRoad')
+        host, port = (endpoint.host, endpoint.port) if endpoint is not None else ('localhost', 2000)
+        self.road_index = road_index
+        self.client = carla.Client(host, port)
+        self.client.set_timeout(20.0)
+        self.client.load_world(town)
+        self.world = self.client.get_world()
+        self.default_settings = self.world.get_settings()
+        settings = self.world.get_settings()
+        settings.synchronous_mode = True
+        settings.fixed_delta_seconds = step_length
+        self.world.apply_settings(settings)
+        self.world.set_weather(carla.WeatherParameters.ClearNoon)
+        self.blueprint_library = self.world.get_blueprint_library()
+        self.actors = []
+        self.sumo_ids = []
+
+    def spawn(self, actor) -> int:
+        blueprint = self.blueprint_library.find(actor.type)
+        transform = carla.Transform(carla.Location(*actor.pos), carla.Rotation(*actor.rot))
+        vehicle = self.world.try_spawn_actor(blueprint, transform)
+        if vehicle is None:
+            raise RuntimeError(f'Could not spawn {actor.type} at {actor.pos}')
+        vehicle.apply_control(carla.VehicleControl(*actor.control))
+        self.actors.append(vehicle)
+        self.sumo_ids.append(actor.sumo_id)
+        return len(self.actors) - 1
+
+    def tick(self) -> float:
+        self.world.tick()
+        return self.world.get_snapshot().timestamp.delta_seconds
+
+    def read_states(self) -> list:
+        _, states = capture_states(self.world, self.actors)
+        return [{'actor_type': state.actor.type_id, 'sumo_id': sumo_id, 'velocity': state.velocity.length(),
+                 'throttle': state.control.throttle, 'steer': state.control.steer, 'brake': state.control.brake,
+                 'acc_x': state.acceleration.x, 'acc_y': state.acceleration.y,
+                 'loc_x': state.transform.location.x, 'loc_y': state.transform.location.y,
+                 'heading': state.transform.rotation.yaw}
+                for state, sumo_id in zip(states, self.sumo_ids)]
+
+    def apply_control(self, handle: int, throttle: float = 0.0, steer: float = 0.0, brake: float = 0.0) -> None:
+        self.actors[handle].apply_control(carla.VehicleControl(throttle=throttle, steer=steer, brake=brake))
+
+    def set_transform(self, handle: int, x: float, y: float, yaw: float) -> None:
+        self.actors[handle].set_transform(carla.Transform(carla.Location(x, y, 0), carla.Rotation(0, yaw, 0)))
+
+    def convert_road(self, x: float, y: float) -> tuple:
+        return self.road_index.convert_road(x, y)
+
+    def close(self) -> None:
+        self.world.apply_settings(self.default_settings)
+        self.client.apply_batch_sync([carla.command.DestroyActor(actor) for actor in self.actors])
+        self.actors = []
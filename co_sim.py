@@ -3,11 +3,17 @@ from __future__ import print_function
 
 import os
 import sys
-import pandas as pd
-import time
 
+from actor_state import capture_states
+from control_schedule import ControlSchedule
+from cosim_scheduler import LockstepScheduler
+from metrics_recorder import MetricsRecorder
+from metrics_sink import open_sink
+from online_metrics import OnlineMetrics
+from coord_transform import carla_to_sumo, carla_yaw_to_sumo_angle
 from scenario_descriptor import ScenarioDescription as sc
 from scenario_descriptor import conv2sumoLoc
+from traffic_lights import TrafficLightController
 
 import carla
 import pygame
@@ -15,49 +21,49 @@ import pygame
 CAMERA_WIDTH = 1280
 CAMERA_HEIGHT = 720
 
+# online comparison of the ego against a reference SUMO trace; with --abort-on-divergence the run
+# stops once a limit is exceeded. Only the position is checked: the logged CARLA runs drive the U-turn
+# much faster than the SUMO reference, so the speed ratio stays far above 1 even for good runs
+REFERENCE_TRACE = 'sumo_logged.csv'
+ABORT_ON_DIVERGENCE = '--abort-on-divergence' in sys.argv
+ABORT_THRESHOLDS = {'magnitude_x': 0.5, 'magnitude_y': 0.1}
+REPORT_EVERY = 50
+
 actor_list = []
-metrics_df = pd.DataFrame(
-    columns=['actor_type', 'sumo_id', 'velocity', 'travelled_distance', 'throttle', 'steer', 'brake', 'acceleration',
-             'acc_x', 'acc_y', 'loc_x', 'loc_y', 'heading', 'time_step'])
-
-def log_metrics(path: str = None, last_tick = False):
-    global metrics_df
-    if path is None:
-        path = os.getcwd()
-    path = os.path.join(path, 'logs')
-    if not os.path.exists(path):
-        os.mkdir(path)
-    filepath = os.path.join(path, f'logged_metrics_{time.time()}.csv')
-    for ac in actor_list:
-        sc_actor = [sc_ac for sc_ac in sc.all_actor if sc_ac.type == ac.type_id][0]
-        actor_type = ac.type_id
-        sumo_id = sc_actor.sumo_id
-        vel = ac.get_velocity().length()
-        time_step = world.get_snapshot().timestamp.delta_seconds
-        travelled_dis = vel * time_step
-        try:
-            type_df = metrics_df.loc[metrics_df['actor_type'] == ac.type_id]
-            travelled_dis = travelled_dis + type_df.iloc[-1,3]
-        except IndexError:
-            pass
-        control = ac.get_control()
-        throttle = control.throttle
-        steer = control.steer
-        brake = control.brake
-        acc_x = ac.get_acceleration().x
-        acc_y = ac.get_acceleration().y
-        acceleration = (acc_x ** 2 + acc_y ** 2) ** (1 / 2)
-        loc_x = ac.get_location().x
-        loc_y = ac.get_location().y
-        heading = ac.get_transform().rotation.yaw
-        new_row = {'actor_type': actor_type, 'sumo_id': sumo_id, 'velocity': vel, 'travelled_distance': travelled_dis,
-                   'throttle': throttle, 'steer': steer, 'brake': brake, 'acceleration': acceleration, 'acc_x': acc_x,
-                   'acc_y': acc_y,'loc_x':loc_x,'loc_y':loc_y,'heading':heading,'time_step':time_step }
-        new_row_df = pd.DataFrame([new_row])
-        metrics_df = pd.concat([metrics_df, new_row_df], ignore_index=True)
-
-        if last_tick:
-            metrics_df.to_csv(filepath, index=False)
+recorder = MetricsRecorder(sink=open_sink(), flush_every=100, scenario=sc.name)
+sumo_ids = {actor.type: actor.sumo_id for actor in sc.all_actor}
+online = OnlineMetrics.from_file(REFERENCE_TRACE, thresholds=ABORT_THRESHOLDS if ABORT_ON_DIVERGENCE else None) \
+    if os.path.exists(REFERENCE_TRACE) else None
+
+def log_metrics(time_step: float, states: list, last_tick=False) -> list:
+    for state in states:
+        recorder.record(
+            actor_type=state.actor.type_id,
+            sumo_id=sumo_ids[state.actor.type_id],
+            velocity=state.velocity.length(),
+            throttle=state.control.throttle,
+            steer=state.control.steer,
+            brake=state.control.brake,
+            acc_x=state.acceleration.x,
+            acc_y=state.acceleration.y,
+            loc_x=state.transform.location.x,
+            loc_y=state.transform.location.y,
+            heading=state.transform.rotation.yaw,
+            time_step=time_step)
+
+    exceeded = []
+    if online is not None:
+        ego = states[0]
+        ego_x, ego_y = carla_to_sumo(ego.transform.location.x, ego.transform.location.y)
+        exceeded = online.update(time_step, ego.velocity.length(),
+                                 float(carla_yaw_to_sumo_angle(ego.transform.rotation.yaw)), float(ego_x), float(ego_y))
+        if recorder.ticks % REPORT_EVERY == 0 or exceeded:
+            print(f'[{recorder.ticks}] {online.summary()}')
+    recorder.tick()
+
+    if last_tick:
+        recorder.close()
+    return exceeded
 
 
 # Set up SUMO simulation
@@ -70,12 +76,16 @@ else:
 
 from sumolib import checkBinary  # noqa
 import traci  # noqa
+from sumo_sync import subscribe_vehicles, sync_commands  # noqa
+from road_index import RoadIndex  # noqa
 
 
 sumoBinary = checkBinary('sumo-gui')
 
 traci.start([sumoBinary, '-c', 'C:\WindowsNoEditor\Co-Simulation\Sumo\examples\Town04.sumocfg',
                  '--step-length', '0.023'])
+road_index = RoadIndex(r'C:\WindowsNoEditor\Co-Simulation\Sumo\examples\net\Town04.net.xml',
+                       fallback=traci.simulation.convertRoad)
 
 
 
@@ -85,7 +95,7 @@ client.set_timeout(20.0)  # Set client timeout
 client.load_world('Town04')
 
 world = client.get_world()
-map = world.get_map()
+carla_map = world.get_map()
 default_settings = world.get_settings()
 settings = world.get_settings()
 settings.synchronous_mode = True
@@ -122,6 +132,8 @@ ego_vehicle_location = carla.Transform(carla.Location(*sc.ego_actor.pos), carla.
 ego_vehicle = world.try_spawn_actor(ego_bp, ego_vehicle_location)
 ego_vehicle.apply_control(carla.VehicleControl(*sc.ego_actor.control))
 actor_list.append(ego_vehicle)
+vehicles = {sc.ego_actor.sumo_id: ego_vehicle}
+control_schedule = ControlSchedule(sc.control_schedules.get('co_sim', ()))
 
 # Spectator
 spectator = world.get_spectator()
@@ -129,6 +141,8 @@ spectator_location = carla.Transform(
     carla.Location(x=-445.9, y=24.23, z=44.5), carla.Rotation(pitch=-47.0, yaw=0.0, roll=0.0))
 spectator.set_transform(spectator_location)
 
+traffic_lights = TrafficLightController(world)
+
 running = True
 
 # Simulation loop
@@ -136,95 +150,87 @@ distance = 0.0
 step = 0
 
 vehic_num = 0
-start_edge_ego, _, start_lane_ego = traci.simulation.convertRoad(*conv2sumoLoc(sc.ego_actor.pos))
-des_edge_ego, _, des_lane_ego = traci.simulation.convertRoad(*conv2sumoLoc(sc.ego_actor.destination_pos))
+start_edge_ego, _, start_lane_ego = road_index.convert_road(*conv2sumoLoc(sc.ego_actor.pos))
+des_edge_ego, _, des_lane_ego = road_index.convert_road(*conv2sumoLoc(sc.ego_actor.destination_pos))
 traci.route.add(f'trip{vehic_num}', [f'{start_edge_ego}', f'{des_edge_ego}'])
 traci.vehicle.add(sc.ego_actor.sumo_id, f'trip{vehic_num}', typeID=sc.ego_actor.type.split('_')[0])
 traci.vehicle.moveToXY(sc.ego_actor.sumo_id, f'{start_edge_ego}', f'{start_lane_ego}',
                        *conv2sumoLoc(sc.ego_actor.pos), keepRoute=1)
 vehic_num += 1
 for actor in sc.other_actors:
-    start_edge_actor, _, start_lane_actor = traci.simulation.convertRoad(*conv2sumoLoc(actor.pos))
-    des_edge_actor, _, des_lane_actor = traci.simulation.convertRoad(*conv2sumoLoc(actor.destination_pos))
+    start_edge_actor, _, start_lane_actor = road_index.convert_road(*conv2sumoLoc(actor.pos))
+    des_edge_actor, _, des_lane_actor = road_index.convert_road(*conv2sumoLoc(actor.destination_pos))
     traci.route.add(f'trip{vehic_num}', [f'{start_edge_actor}', f'{des_edge_actor}'])
     traci.vehicle.add(actor.sumo_id, f'trip{vehic_num}', typeID=actor.type)
     traci.vehicle.moveToXY(actor.sumo_id, f'{start_edge_actor}', f'{start_lane_actor}',
                            *conv2sumoLoc(actor.pos), keepRoute=1)
     vehic_num += 1
+subscribe_vehicles(sumo_vehicle_ids)
 
 running = True
 
+
+def tick_carla():
+    world.tick()
+    # one snapshot per tick, the ego is the first entry of actor_list
+    return capture_states(world, actor_list)
+
+
+# SUMO step and CARLA tick (with its snapshot) run at the same time; the state exchange below happens
+# between the step barriers, so both simulators see each other's previous step as in a sequential loop
+scheduler = LockstepScheduler(traci.simulationStep, tick_carla)
+
 while step < 401:
     if step == 400:
         running = False
 
+    _, (time_step, states) = scheduler.step()
+    ego_state = states[0]
 
-    traci.simulationStep()  # Advance SUMO simulation by one time step
-    world.tick()
-    
-    x_offset = 503.02
-    y_offset = 423.76
-
-    # Update SUMO-controlled vehicles positions and velocities based on SUMO states
-    for vehicle, vehicle_id in zip(carla_vehicles, sumo_vehicle_ids):
-        sumo_vehicle_pos = traci.vehicle.getPosition(vehicle_id)
-        sumo_vehicle_ori = traci.vehicle.getAngle(vehicle_id)
-        sumo_vehicle_speed = traci.vehicle.getSpeed(vehicle_id)
-        sumo_vehicle_acc = traci.vehicle.getAcceleration(vehicle_id)
-
-        vehicle.set_transform(
-            carla.Transform(
-                carla.Location(sumo_vehicle_pos[0] - x_offset, y_offset - sumo_vehicle_pos[1], 0),
-                carla.Rotation(0, sumo_vehicle_ori - 90, 0)
-            )
-        )
-        vehicle.set_target_velocity(
-            carla.Vector3D(sumo_vehicle_speed * 3.6, 0, 0)  # Convert SUMO speed to CARLA velocity (km/h)
-        )
-
-    # Get CARLA-controlled ego vehicle state and update SUMO state
-    ego_vehicle_speed = ego_vehicle.get_velocity().x / 3.6  # Convert CARLA velocity to SUMO speed (m/s)
-    ego_vehicle_angle = ego_vehicle.get_transform().rotation.yaw + 90
-
-    sumo_x = ego_vehicle_location.location.x + x_offset
-    sumo_y = y_offset - ego_vehicle_location.location.y
-    edgeID, _, lane = traci.simulation.convertRoad(sumo_x, sumo_y)
-    traci.vehicle.moveToXY(ego_vehicle_id, edgeID, lane, sumo_x, sumo_y, ego_vehicle_angle)
-    traci.vehicle.setSpeed(ego_vehicle_id, ego_vehicle_speed)
+    with scheduler.phase('exchange'):
+        # Update SUMO-controlled vehicles positions and velocities based on SUMO states, in one batch
+        client.apply_batch_sync(sync_commands(carla_vehicles, sumo_vehicle_ids))
+
+        # Get CARLA-controlled ego vehicle state and update SUMO state
+        ego_vehicle_speed = ego_state.velocity.x / 3.6  # Convert CARLA velocity to SUMO speed (m/s)
+        ego_vehicle_angle = float(carla_yaw_to_sumo_angle(ego_state.transform.rotation.yaw))
+
+        sumo_x, sumo_y = (float(v) for v in carla_to_sumo(ego_vehicle_location.location.x, ego_vehicle_location.location.y))
+        edgeID, _, lane = road_index.convert_road(sumo_x, sumo_y)
+        traci.vehicle.moveToXY(ego_vehicle_id, edgeID, lane, sumo_x, sumo_y, ego_vehicle_angle)
+        traci.vehicle.setSpeed(ego_vehicle_id, ego_vehicle_speed)
 
     #------------------------------------------------------------------------------
     # EGO control segment : START
-    current_location = ego_vehicle.get_transform().location
-    distance += ego_vehicle_location.location.distance(current_location)
-    ego_vehicle_location.location = current_location
-    # set Traffic Lights
-    actors = world.get_actors().filter('traffic.traffic_light')
-    for actor in actors:
-        state = carla.TrafficLightState.Red
-        light_dis = actor.get_location().distance(current_location)
-        if light_dis < 55:
-            state = carla.TrafficLightState.Yellow
-        if light_dis < 45:
-            state = carla.TrafficLightState.Green
-        actor.set_state(state)
-
-    if distance > 20:
-        ego_vehicle.apply_control(carla.VehicleControl(brake=0.8, steer=0.0))
-    if distance > 34:
-        ego_vehicle.apply_control(carla.VehicleControl(throttle=1.0, steer=-0.3))
-    if distance > 67:
-        ego_vehicle.apply_control(carla.VehicleControl(throttle=4.0, steer=0.0))
-    if distance > 83:
-        ego_vehicle.apply_control(carla.VehicleControl(throttle=1.0, steer=0.07))
-    if distance > 87:
-        ego_vehicle.apply_control(carla.VehicleControl(throttle=1.0, steer=0.0))
+    with scheduler.phase('control'):
+        current_location = ego_state.transform.location
+        distance += ego_vehicle_location.location.distance(current_location)
+        ego_vehicle_location.location = current_location
+        # set Traffic Lights
+        traffic_lights.update(current_location)
+
+        # scenario control schedule: one batch per tick at most, and only when a control changed
+        changes = control_schedule.update(distance)
+        if changes:
+            client.apply_batch([carla.command.ApplyVehicleControl(vehicles[actor].id, carla.VehicleControl(*control))
+                                for actor, control in changes])
 
     # EGO control segment : END
     #------------------------------------------------------------------------------
 
-    log_metrics(last_tick=not running)
+    with scheduler.phase('logging'):
+        exceeded = log_metrics(time_step, states, last_tick=not running)
+    if exceeded:
+        print(f'Aborting run at step {step}: {", ".join(exceeded)} above the limit')
+        break
+    if step % REPORT_EVERY == 0:
+        print(f'[{step}] {scheduler.summary()}')
 
     step += 1
 # Cleanup
+print(scheduler.report())
+scheduler.close()
+recorder.close()
+traffic_lights.release()
 traci.close()
 client.apply_batch([carla.command.DestroyActor(actor) for actor in actor_list])
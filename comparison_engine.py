@@ -0,0 +1,161 @@
+import multiprocessing as mp
+import os
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from dtw_engine import dtw
+
+Comparison = namedtuple('Comparison', ['label', 'a', 'b'])
+ComparisonResult = namedtuple('ComparisonResult', ['label', 'dtw_distance', 'magnitude_error', 'topology_error'])
+
+_worker = None
+
+
+def cost_function(ai, bi, ti, tj, dAts_dt_i, dBts_dt_i):
+    return ((ai - bi)**2 + (ti - tj)**2) * np.abs(dAts_dt_i - dBts_dt_i)
+
+
+def _warped_error(a, b, warped_path) -> float:
+    # sum |a[i] - b[j]| / sum |b[j]| over the (i, j) cells of the path
+    path = np.asarray(warped_path, dtype=np.intp).reshape(-1, 2)
+    b_warped = b[path[:, 1]]
+    return np.abs(a[path[:, 0]] - b_warped).sum() / np.abs(b_warped).sum()
+
+
+def _gradient(x):
+    return np.gradient(x) if len(x) > 1 else np.zeros_like(x)
+
+
+def calculate_magnitude_error(Ats, Bts, warped_path):
+    return _warped_error(np.asarray(Ats, dtype=float), np.asarray(Bts, dtype=float), warped_path)
+
+
+def calculate_topology_error(Ats, Bts, warped_path, Ats_derivative=None, Bts_derivative=None):
+    # pass the derivatives when they are already known to skip recomputing the gradients
+    if Ats_derivative is None:
+        Ats_derivative = _gradient(np.asarray(Ats, dtype=float))
+    if Bts_derivative is None:
+        Bts_derivative = _gradient(np.asarray(Bts, dtype=float))
+    return _warped_error(np.asarray(Ats_derivative), np.asarray(Bts_derivative), warped_path)
+
+
+def distinct_signals(comparisons: list) -> tuple:
+    """
+    Every distinct signal of the comparisons (by identity) as a float array together with its gradient,
+    so a signal shared by several comparisons is converted and differentiated only once.
+    Returns (signals, gradients), both keyed by id() of the signal objects of the comparisons.
+    """
+    signals, gradients = {}, {}
+    for job in comparisons:
+        for signal in (job.a, job.b):
+            if id(signal) not in signals:
+                signals[id(signal)] = np.asarray(signal, dtype=float).ravel()
+                gradients[id(signal)] = _gradient(signals[id(signal)])
+    return signals, gradients
+
+
+def batch_errors(pairs: list, paths: list, derivatives: list = None) -> tuple:
+    """
+    Magnitude and topology errors of many (a, b) signal pairs and their warping paths in one pass.
+    Every distinct signal and its gradient is packed once, all paths are gathered with a single
+    fancy index and summed per path with np.add.reduceat. Returns two arrays, one value per pair.
+    derivatives, one (derivative_a, derivative_b) per pair, skips recomputing known gradients.
+    """
+    if not pairs:
+        return np.empty(0), np.empty(0)
+    signals, gradients, offsets = [], [], {}
+    for pair, pair_derivatives in zip(pairs, derivatives or [(None, None)] * len(pairs)):
+        for signal, derivative in zip(pair, pair_derivatives):
+            if id(signal) not in offsets:
+                offsets[id(signal)] = sum(len(x) for x in signals)
+                signals.append(np.asarray(signal, dtype=float))
+                gradients.append(_gradient(signals[-1]) if derivative is None else np.asarray(derivative, dtype=float))
+    values = np.concatenate(signals)
+    gradients = np.concatenate(gradients)
+
+    paths = [np.asarray(path, dtype=np.intp).reshape(-1, 2) for path in paths]
+    lengths = np.array([len(path) for path in paths])
+    if (lengths == 0).any():
+        raise ValueError('Warping paths must not be empty')
+    a_index = np.concatenate([path[:, 0] + offsets[id(a)] for (a, _), path in zip(pairs, paths)])
+    b_index = np.concatenate([path[:, 1] + offsets[id(b)] for (_, b), path in zip(pairs, paths)])
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+    def per_path(x):
+        b_warped = x[b_index]
+        return np.add.reduceat(np.abs(x[a_index] - b_warped), starts) / np.add.reduceat(np.abs(b_warped), starts)
+
+    return per_path(values), per_path(gradients)
+
+
+def compare(a, b, cost=cost_function, radius: int = None, derivative_a=None, derivative_b=None) -> tuple:
+    """DTW distance, magnitude error and topology error of one signal pair."""
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    # the gradients feed both the DTW cost and the topology error
+    if derivative_a is None:
+        derivative_a = _gradient(a)
+    if derivative_b is None:
+        derivative_b = _gradient(b)
+    distance, path = dtw(a, b, cost, derivative_a, derivative_b, radius=radius)
+    return (distance, calculate_magnitude_error(a, b, path),
+            calculate_topology_error(a, b, path, derivative_a, derivative_b))
+
+
+def _attach(name: str, size: int, cost, radius) -> None:
+    # every worker maps the packed signals and gradients once, tasks only carry offsets
+    global _worker
+    shm = shared_memory.SharedMemory(name=name)
+    _worker = (shm, np.ndarray((2, size), dtype=np.float64, buffer=shm.buf), cost, radius)
+
+
+def _run_slices(task) -> tuple:
+    (a_start, a_stop), (b_start, b_stop) = task
+    _, (data, gradients), cost, radius = _worker
+    return compare(data[a_start:a_stop], data[b_start:b_stop], cost, radius,
+                   gradients[a_start:a_stop], gradients[b_start:b_stop])
+
+
+def run_comparisons(comparisons: list, cost=cost_function, radius: int = None, processes: int = None) -> list:
+    """
+    Evaluate every Comparison on a process pool. Every distinct signal and its gradient is packed once
+    into one shared-memory block, so only slice offsets are sent to the workers and only three floats
+    come back per comparison. The cost function must be picklable (defined at module level).
+    """
+    processes = min(processes or os.cpu_count(), len(comparisons))
+    signals, gradients = distinct_signals(comparisons)
+    if processes <= 1:
+        pairs = [(signals[id(job.a)], signals[id(job.b)]) for job in comparisons]
+        derivatives = [(gradients[id(job.a)], gradients[id(job.b)]) for job in comparisons]
+        distances, paths = zip(*(dtw(a, b, cost, da, db, radius=radius)
+                                 for (a, b), (da, db) in zip(pairs, derivatives))) if pairs else ((), ())
+        magnitude, topology = batch_errors(pairs, paths, derivatives)
+        return [ComparisonResult(job.label, *values)
+                for job, values in zip(comparisons, zip(distances, magnitude, topology))]
+
+    bounds, size = {}, 0
+    for key, signal in signals.items():
+        bounds[key] = (size, size + len(signal))
+        size += len(signal)
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1) * 2 * 8)
+    try:
+        packed = np.ndarray((2, size), dtype=np.float64, buffer=shm.buf)
+        for key, (start, stop) in bounds.items():
+            packed[0, start:stop] = signals[key]
+            packed[1, start:stop] = gradients[key]
+        tasks = [(bounds[id(job.a)], bounds[id(job.b)]) for job in comparisons]
+        # hand out the largest grids first so no worker is left with a long job at the end
+        order = sorted(range(len(tasks)), key=lambda k: -(tasks[k][0][1] - tasks[k][0][0]) * (tasks[k][1][1] - tasks[k][1][0]))
+        with mp.Pool(processes, initializer=_attach, initargs=(shm.name, size, cost, radius)) as pool:
+            values = pool.map(_run_slices, [tasks[k] for k in order], chunksize=1)
+        del packed
+    finally:
+        shm.close()
+        shm.unlink()
+
+    results = [None] * len(comparisons)
+    for k, value in zip(order, values):
+        results[k] = ComparisonResult(comparisons[k].label, *value)
+    return results
@@ -0,0 +1,53 @@
+import bisect
+from collections import namedtuple
+
+# once the travelled distance of the ego exceeds `distance`, `actor` (a sumo_id) drives with `control`
+Breakpoint = namedtuple('Breakpoint', ['distance', 'actor', 'control'])
+
+
+def parse_schedule(items: list, where: str, actor_ids: list) -> tuple:
+    """Breakpoints of a scenario file entry: a list of {distance, actor, control: [throttle, steer, brake]}."""
+    if not isinstance(items, list):
+        raise ValueError(f'{where}: expected a list of breakpoints')
+    breakpoints = []
+    for idx, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('distance'), (int, float)):
+            raise ValueError(f'{where}[{idx}]: a breakpoint needs a numeric distance')
+        if item.get('actor') not in actor_ids:
+            raise ValueError(f'{where}[{idx}]: unknown actor {item.get("actor")!r}, expected one of {actor_ids}')
+        control = item.get('control')
+        if not isinstance(control, (list, tuple)) or len(control) != 3:
+            raise ValueError(f'{where}[{idx}]: control must be a list of 3 numbers')
+        breakpoints.append(Breakpoint(float(item['distance']), item['actor'], tuple(map(float, control))))
+    return tuple(breakpoints)
+
+
+class ControlSchedule:
+    """
+    Distance-triggered controls of several actors. Breakpoints are kept sorted per actor and looked up
+    with bisect; update() only returns the controls that differ from the ones issued before, so an
+    unchanged manoeuvre costs no command at all. Breakpoints with the same distance keep their file order.
+    """
+
+    def __init__(self, breakpoints):
+        self.distances = {}
+        self.controls = {}
+        for breakpoint in sorted(breakpoints, key=lambda bp: bp.distance):
+            self.distances.setdefault(breakpoint.actor, []).append(breakpoint.distance)
+            self.controls.setdefault(breakpoint.actor, []).append(breakpoint.control)
+        self.active = dict.fromkeys(self.distances)
+
+    def control_at(self, actor: str, distance: float):
+        # the last breakpoint strictly below the distance, like the `if distance > X` chains it replaces
+        idx = bisect.bisect_left(self.distances[actor], distance)
+        return self.controls[actor][idx - 1] if idx else None
+
+    def update(self, distance: float) -> list:
+        """(actor, (throttle, steer, brake)) for every actor whose scheduled control changed."""
+        changes = []
+        for actor in self.distances:
+            control = self.control_at(actor, distance)
+            if control is not None and control != self.active[actor]:
+                self.active[actor] = control
+                changes.append((actor, control))
+        return changes
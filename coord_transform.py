@@ -0,0 +1,33 @@
+import numpy as np
+
+# SUMO net offset of each CARLA map, sumo = (carla_x + x_offset, y_offset - carla_y)
+MAP_OFFSETS = {'Town04': (503.02, 423.76)}
+TOWN04_OFFSET = MAP_OFFSETS['Town04']
+
+
+def wrap_180(angle):
+    # [-180, 180)
+    return np.mod(np.asarray(angle, dtype=float) + 180.0, 360.0) - 180.0
+
+
+def wrap_360(angle):
+    # [0, 360)
+    return np.mod(np.asarray(angle, dtype=float), 360.0)
+
+
+def carla_to_sumo(x, y, offset: tuple = TOWN04_OFFSET) -> tuple:
+    """CARLA location(s) to SUMO x, y; works on scalars and arrays."""
+    return np.add(x, offset[0]), np.subtract(offset[1], y)
+
+
+def sumo_to_carla(x, y, offset: tuple = TOWN04_OFFSET) -> tuple:
+    return np.subtract(x, offset[0]), np.subtract(offset[1], y)
+
+
+def carla_yaw_to_sumo_angle(yaw):
+    # CARLA yaw is counted from +x towards +y, SUMO angle clockwise from north
+    return wrap_360(np.add(yaw, 90.0))
+
+
+def sumo_angle_to_carla_yaw(angle):
+    return wrap_180(np.subtract(angle, 90.0))
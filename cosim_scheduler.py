@@ -0,0 +1,68 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+from tabulate import tabulate
+
+
+class LockstepScheduler:
+    """
+    Steps SUMO and CARLA in lock-step with their blocking step calls overlapped on two threads.
+    step() starts both and returns once both are done (the step barrier). The caller exchanges state
+    between barriers, so each simulator always sees the other's state of the previous step, the same
+    as when the two calls run one after another. Every phase is timed: 'sumo' and 'carla' are the step
+    calls, 'step' the overlapped wall time, and the caller adds its own phases with phase(name).
+    """
+
+    def __init__(self, sumo_step, carla_step):
+        self.sumo_step = sumo_step
+        self.carla_step = carla_step
+        self.pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cosim')
+        self.timings = {'sumo': [], 'carla': [], 'step': []}
+
+    def _timed(self, name: str, call):
+        start = time.perf_counter()
+        result = call()
+        self.timings[name].append(time.perf_counter() - start)
+        return result
+
+    def step(self) -> tuple:
+        """Advance both simulators by one step, returns (SUMO result, CARLA result)."""
+        start = time.perf_counter()
+        sumo = self.pool.submit(self._timed, 'sumo', self.sumo_step)
+        carla = self.pool.submit(self._timed, 'carla', self.carla_step)
+        # barrier: an exception of either simulator is raised here
+        results = sumo.result(), carla.result()
+        self.timings['step'].append(time.perf_counter() - start)
+        return results
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.setdefault(name, []).append(time.perf_counter() - start)
+
+    def bound_by(self) -> str:
+        # the simulator with the slower mean step limits the step rate
+        return 'sumo' if np.mean(self.timings['sumo'] or [0]) >= np.mean(self.timings['carla'] or [0]) else 'carla'
+
+    def summary(self) -> str:
+        means = ', '.join(f'{name}={np.mean(values) * 1e3:.1f}ms' for name, values in self.timings.items() if values)
+        return f'{means} (bound by {self.bound_by()})'
+
+    def report(self) -> str:
+        table = [["Phase", "Steps", "Mean [ms]", "Max [ms]", "Total [s]"]]
+        for name, values in self.timings.items():
+            if values:
+                values = np.asarray(values)
+                table.append([name, len(values), values.mean() * 1e3, values.max() * 1e3, values.sum()])
+        sequential = sum(self.timings['sumo']) + sum(self.timings['carla'])
+        overlapped = sum(self.timings['step'])
+        return (f'{tabulate(table, headers="firstrow")}\n'
+                f'Bound by {self.bound_by()}, overlapping saved {sequential - overlapped:.2f} s')
+
+    def close(self) -> None:
+        self.pool.shutdown()
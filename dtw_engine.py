@@ -0,0 +1,206 @@
+import numpy as np
+
+
+def _connect_window(lo, hi, m):
+    # Make the per-row bounds describe a connected band from (1, 1) to (n, m)
+    lo = np.clip(lo, 1, m)
+    hi = np.clip(hi, 1, m)
+    lo[1] = 1
+    hi[-1] = m
+    hi[1:] = np.maximum.accumulate(hi[1:])
+    lo[1:] = np.minimum.accumulate(lo[1:][::-1])[::-1]
+    lo[2:] = np.minimum(lo[2:], hi[1:-1] + 1)
+    hi[1:] = np.maximum(hi[1:], lo[1:])
+    return lo, hi
+
+
+def sakoe_chiba_window(n: int, m: int, radius: int) -> tuple:
+    """Row bounds (lo, hi) of a Sakoe-Chiba band, widened by |n - m| so the end cell stays reachable."""
+    i = np.arange(n + 1)
+    if n <= m:
+        lo, hi = i - radius, i + (m - n) + radius
+    else:
+        lo, hi = i - (n - m) - radius, i + radius
+    return _connect_window(lo, hi, m)
+
+
+def itakura_window(n: int, m: int, max_slope: float = 2.0) -> tuple:
+    """Row bounds (lo, hi) of an Itakura parallelogram with the given maximum slope."""
+    x = np.arange(-1, n, dtype=float)
+    lo = np.maximum(x / max_slope, (m - 1) - max_slope * (n - 1 - x))
+    hi = np.minimum(max_slope * x, (m - 1) - (n - 1 - x) / max_slope)
+    lo = np.ceil(lo).astype(int) + 1
+    hi = np.floor(hi).astype(int) + 1
+    return _connect_window(lo, hi, m)
+
+
+def path_window(path, n: int, m: int, radius: int) -> tuple:
+    """Row bounds (lo, hi) of a path found on the half-resolution grid, projected onto n x m and widened by radius."""
+    path = np.asarray(path)
+    lo = np.full(n, m)
+    hi = np.full(n, -1)
+    # every coarse cell covers a 2 x 2 block of fine cells
+    for offset in (0, 1):
+        rows = np.minimum(2 * path[:, 0] + offset, n - 1)
+        np.minimum.at(lo, rows, 2 * path[:, 1])
+        np.maximum.at(hi, rows, np.minimum(2 * path[:, 1] + 1, m - 1))
+    wide_lo, wide_hi = lo.copy(), hi.copy()
+    for d in range(1, min(radius, n - 1) + 1):
+        wide_lo[d:] = np.minimum(wide_lo[d:], lo[:-d])
+        wide_lo[:-d] = np.minimum(wide_lo[:-d], lo[d:])
+        wide_hi[d:] = np.maximum(wide_hi[d:], hi[:-d])
+        wide_hi[:-d] = np.maximum(wide_hi[:-d], hi[d:])
+    # shift to the 1-based rows and columns of dtw_grid
+    lo = np.concatenate([[0], wide_lo - radius + 1])
+    hi = np.concatenate([[0], wide_hi + radius + 1])
+    return _connect_window(lo, hi, m)
+
+
+def dtw_grid(n: int, m: int, cell_cost, window: tuple = None, return_path: bool = True):
+    """
+    Dynamic time warping over an n x m grid, filled one anti-diagonal at a time.
+    cell_cost(i, j) gets 0-based index arrays of a diagonal and returns their costs.
+    window is an optional (lo, hi) pair of per-row column bounds (see sakoe_chiba_window).
+    Returns (distance, path) with the path as a (k, 2) array of 0-based (i, j) indices,
+    or only the distance when return_path is False.
+    """
+    if n == 0 or m == 0:
+        distance = 0.0 if n == m else np.inf
+        return (distance, np.zeros((1, 2), dtype=np.intp)) if return_path else distance
+
+    if window is not None:
+        lo, hi = window
+        rows = np.arange(1, n + 1)
+        first_cell = rows + lo[1:]
+        last_cell = rows + hi[1:]
+
+    # Three rolling diagonals indexed by row, plus the row range written into each
+    diagonals = [np.full(n + 1, np.inf) for _ in range(3)]
+    written = [(0, 1), (0, 0), (0, 0)]
+    diagonals[0][0] = 0
+    stored = [(0, diagonals[0][:1].copy()), (0, diagonals[1][:0].copy())] if return_path else None
+
+    for k in range(2, n + m + 1):
+        prev2, prev1, cur = diagonals[(k - 2) % 3], diagonals[(k - 1) % 3], diagonals[k % 3]
+        old_a, old_b = written[k % 3]
+        cur[old_a:old_b] = np.inf
+
+        a, b = max(1, k - m), min(n, k - 1) + 1
+        if window is not None:
+            a = max(a, 1 + int(np.searchsorted(last_cell, k, side='left')))
+            b = min(b, 1 + int(np.searchsorted(first_cell, k, side='right')))
+        if a < b:
+            i = np.arange(a, b)
+            cost = cell_cost(i - 1, k - i - 1)
+            best = np.minimum(np.minimum(prev1[a - 1:b - 1], prev1[a:b]), prev2[a - 1:b - 1])
+            cur[a:b] = cost + best
+        else:
+            a = b = 0
+        written[k % 3] = (a, b)
+        if stored is not None:
+            stored.append((a, cur[a:b].copy()))
+
+    distance = diagonals[(n + m) % 3][n]
+    if not return_path:
+        return distance
+
+    def cell(i, j):
+        if i == 0 or j == 0:
+            return 0.0 if i == j else np.inf
+        start, values = stored[i + j]
+        idx = i - start
+        return values[idx] if 0 <= idx < len(values) else np.inf
+
+    # Backtrack to find the optimal warping path
+    i, j = n, m
+    path = []
+    while i > 0 and j > 0:
+        path.append((i - 1, j - 1))
+        diag, up, left = cell(i - 1, j - 1), cell(i - 1, j), cell(i, j - 1)
+        best = min(diag, up, left)
+        if diag == best:
+            i, j = i - 1, j - 1
+        elif up == best:
+            i -= 1
+        else:
+            j -= 1
+    path.append((0, 0))
+
+    return distance, np.array(path[::-1], dtype=np.intp)
+
+
+def _coarsen(x):
+    # pairwise means, an odd last sample is kept as is
+    starts = np.arange(0, len(x), 2)
+    return np.add.reduceat(x, starts) / np.diff(np.append(starts, len(x)))
+
+
+def _signal_cost(cost_function, s, t, derivative_s, derivative_t, time_s, time_t):
+    def diagonal_cost(i, j):
+        return cost_function(s[i], t[j], time_s[i], time_t[j], derivative_s[i], derivative_t[j])
+
+    return diagonal_cost
+
+
+def _multiresolution_dtw(signals: tuple, cost_function, radius: int, return_path: bool):
+    n, m = len(signals[0]), len(signals[1])
+    if min(n, m) <= radius + 2:
+        return dtw_grid(n, m, _signal_cost(cost_function, *signals), return_path=return_path)
+    # solve the half-resolution problem, then only refine the band around its path
+    coarse = tuple(_coarsen(x) for x in signals)
+    _, coarse_path = _multiresolution_dtw(coarse, cost_function, radius, True)
+    window = path_window(coarse_path, n, m, radius)
+    return dtw_grid(n, m, _signal_cost(cost_function, *signals), window=window, return_path=return_path)
+
+
+def dtw(s, t, cost_function, derivative_s=None, derivative_t=None, window: tuple = None, return_path: bool = True,
+        radius: int = None):
+    """
+    DTW between the signals s and t.
+    cost_function(ai, bi, ti, tj, dA, dB) is called once per anti-diagonal with arrays of samples,
+    1-based time indices and derivatives. Derivatives default to np.gradient of each signal.
+    With a radius the path is found coarse-to-fine (FastDTW): the signals are halved until they are
+    shorter than radius + 2 and each level only evaluates the band of +-radius cells around the projected
+    path of the level below, so memory grows with (n + m) * radius instead of n * m. The result is an
+    upper bound of the exact distance, see approximation_error.
+    """
+    s = np.asarray(s, dtype=float)
+    t = np.asarray(t, dtype=float)
+    if derivative_s is None:
+        derivative_s = np.gradient(s) if len(s) > 1 else np.zeros_like(s)
+    if derivative_t is None:
+        derivative_t = np.gradient(t) if len(t) > 1 else np.zeros_like(t)
+    derivative_s = np.asarray(derivative_s, dtype=float)
+    derivative_t = np.asarray(derivative_t, dtype=float)
+    if len(derivative_s) != len(s) or len(derivative_t) != len(t):
+        raise ValueError('Derivative arrays must match the length of their signals')
+
+    time_s = np.arange(1, len(s) + 1)
+    time_t = np.arange(1, len(t) + 1)
+    if radius is None:
+        return dtw_grid(len(s), len(t), _signal_cost(cost_function, s, t, derivative_s, derivative_t, time_s, time_t),
+                        window=window, return_path=return_path)
+    if window is not None:
+        raise ValueError('window and radius cannot be combined')
+    if radius < 0:
+        raise ValueError('radius must not be negative')
+    if len(s) == 0 or len(t) == 0:
+        return dtw_grid(len(s), len(t), None, return_path=return_path)
+    # coarse levels keep the mean time index of the samples they merge
+    signals = (s, t, derivative_s, derivative_t, time_s.astype(float), time_t.astype(float))
+    return _multiresolution_dtw(signals, cost_function, radius, return_path)
+
+
+def approximation_error(s, t, cost_function, radius: int) -> dict:
+    """Compare the multiresolution DTW of the given radius with the exact DTW of the same signals."""
+    exact, exact_path = dtw(s, t, cost_function)
+    approx, approx_path = dtw(s, t, cost_function, radius=radius)
+    # compare the paths as sets of flat cell indices
+    exact_cells = np.unique(exact_path[:, 0] * len(t) + exact_path[:, 1])
+    approx_cells = approx_path[:, 0] * len(t) + approx_path[:, 1]
+    return {
+        'exact': exact,
+        'approx': approx,
+        'relative_error': (approx - exact) / exact if exact else approx - exact,
+        'path_overlap': np.isin(exact_cells, approx_cells).mean(),
+    }
@@ -0,0 +1,176 @@
+import json
+import os
+import re
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+from metrics_recorder import COLUMNS, NUMERIC_COLUMNS
+from metrics_sink import read_manifest, read_metrics
+
+LOG_PATTERN = re.compile(r'^logged_metrics_(?P<run_id>\d+(?:\.\d+)?)\.(?:csv|arrow|parquet)$')
+STORE_DIR = 'store'
+INDEX_FILE = 'catalog.json'
+KEY_COLUMNS = ('actor_type', 'sumo_id')
+
+
+def _actor_time(df: pd.DataFrame) -> np.ndarray:
+    # logs written before the time column existed: rebuild it per actor like MetricsRecorder does
+    time_step = df.groupby('sumo_id', sort=False)['time_step']
+    return (time_step.cumsum() - time_step.transform('first')).to_numpy()
+
+
+class LogCatalog:
+    """
+    Columnar store of the logged_metrics_* files of a logs directory.
+    Every run is split per actor into one .npy file per numeric column, sorted by time, under
+    logs/store/<run_id>/<sumo_id>/. catalog.json indexes run id, scenario, actors and time ranges.
+    Reads memory-map only the requested columns and slice time windows by binary search,
+    so a per-actor or per-window read never parses the whole log. Empty or unreadable logs (runs that
+    died before their first flush) are indexed without rows and left out of select() and latest().
+    """
+
+    def __init__(self, logs_dir: str = None):
+        self.logs_dir = logs_dir or os.path.join(os.getcwd(), 'logs')
+        self.store_dir = os.path.join(self.logs_dir, STORE_DIR)
+        self.index_path = os.path.join(self.store_dir, INDEX_FILE)
+        self.runs = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.runs = json.load(f)['runs']
+
+    def refresh(self) -> list:
+        """Convert new or changed log files into the store, returns the ids of the runs that were (re)built."""
+        built = []
+        for name in sorted(os.listdir(self.logs_dir)):
+            match = LOG_PATTERN.match(name)
+            if match is None:
+                continue
+            run_id = match.group('run_id')
+            stat = os.stat(os.path.join(self.logs_dir, name))
+            entry = self.runs.get(run_id)
+            if entry is not None and (entry['source_size'], entry['source_mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            try:
+                self.runs[run_id] = self._convert(run_id, name, stat)
+            except ImportError as e:
+                # not indexed, so the log is picked up once the reader library is installed
+                print(f'Skipping log {name}: {e}')
+                continue
+            except (OSError, ValueError, KeyError) as e:
+                print(f'Skipping unreadable log {name}: {e!r}')
+                self.runs[run_id] = self._empty_entry(name, stat, repr(e))
+            built.append(run_id)
+        if built:
+            self._save_index()
+        return built
+
+    def _convert(self, run_id: str, name: str, stat) -> dict:
+        filepath = os.path.join(self.logs_dir, name)
+        df = read_metrics(filepath)
+        if 'time' not in df:
+            df['time'] = _actor_time(df)
+        columns = [col for col in NUMERIC_COLUMNS if col in df]
+
+        run_dir = os.path.join(self.store_dir, run_id)
+        shutil.rmtree(run_dir, ignore_errors=True)
+        actors = {}
+        for sumo_id, rows in df.groupby('sumo_id', sort=False):
+            rows = rows.sort_values('time', kind='stable')
+            actor_dir = os.path.join(run_dir, sumo_id)
+            os.makedirs(actor_dir)
+            for col in columns:
+                np.save(os.path.join(actor_dir, f'{col}.npy'), rows[col].to_numpy(dtype=float))
+            actors[sumo_id] = {'actor_type': rows.actor_type.iloc[0], 'rows': len(rows),
+                               'time': [float(rows.time.iloc[0]), float(rows.time.iloc[-1])]}
+
+        manifest = read_manifest(filepath) or {}
+        return {
+            'source': name,
+            'source_size': stat.st_size,
+            'source_mtime_ns': stat.st_mtime_ns,
+            'scenario': manifest.get('scenario'),
+            'complete': bool(manifest.get('complete', False)),
+            'rows': len(df),
+            'columns': columns,
+            'actors': actors,
+            'time': [min(a['time'][0] for a in actors.values()), max(a['time'][1] for a in actors.values())]
+            if actors else None,
+        }
+
+    @staticmethod
+    def _empty_entry(name: str, stat, error: str) -> dict:
+        # indexed with its size and mtime so the file is only retried once it changes
+        return {'source': name, 'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns, 'scenario': None,
+                'complete': False, 'rows': 0, 'columns': [], 'actors': {}, 'time': None, 'error': error}
+
+    def _save_index(self) -> None:
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp_path = f'{self.index_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'runs': self.runs}, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def select(self, scenario: str = None, complete: bool = None, empty: bool = False) -> list:
+        """Run ids matching the filters, oldest first (the id is the start timestamp of the run).
+        Runs without rows are only included with empty=True."""
+        return sorted((run_id for run_id, entry in self.runs.items()
+                       if (scenario is None or entry['scenario'] == scenario)
+                       and (complete is None or entry['complete'] == complete)
+                       and (empty or entry['rows'] > 0)), key=float)
+
+    def latest(self, scenario: str = None, complete: bool = None):
+        run_ids = self.select(scenario, complete)
+        return run_ids[-1] if run_ids else None
+
+    def column(self, run_id: str, sumo_id: str, column: str, time_range: tuple = None) -> np.ndarray:
+        """One column of one actor as a read-only memory map, optionally limited to time_range (inclusive)."""
+        actor_dir = os.path.join(self.store_dir, run_id, sumo_id)
+        values = np.load(os.path.join(actor_dir, f'{column}.npy'), mmap_mode='r')
+        if time_range is None:
+            return values
+        time = np.load(os.path.join(actor_dir, 'time.npy'), mmap_mode='r')
+        start, stop = np.searchsorted(time, time_range[0], 'left'), np.searchsorted(time, time_range[1], 'right')
+        return values[start:stop]
+
+    def read(self, run_id: str, actors: list = None, columns: list = None, time_range: tuple = None) -> pd.DataFrame:
+        """DataFrame of the given actors (default all) with only the requested columns, in COLUMNS order."""
+        entry = self.runs[run_id]
+        available = [*KEY_COLUMNS, *entry['columns']]
+        if columns is None:
+            columns = available
+        else:
+            unknown = set(columns) - set(available)
+            if unknown:
+                raise ValueError(f'Run {run_id} has no column(s) {sorted(unknown)}')
+            columns = [col for col in COLUMNS if col in columns]
+        frames = []
+        for sumo_id in entry['actors'] if actors is None else actors:
+            # copy the sliced pages out of the memory maps so no file stays open
+            data = {col: np.array(self.column(run_id, sumo_id, col, time_range))
+                    for col in columns if col not in KEY_COLUMNS}
+            rows = len(self.column(run_id, sumo_id, 'time', time_range)) if not data else len(next(iter(data.values())))
+            if 'actor_type' in columns:
+                data['actor_type'] = np.full(rows, entry['actors'][sumo_id]['actor_type'], dtype=object)
+            if 'sumo_id' in columns:
+                data['sumo_id'] = np.full(rows, sumo_id, dtype=object)
+            frames.append(pd.DataFrame(data, columns=columns))
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == '__main__':
+    from tabulate import tabulate
+
+    catalog = LogCatalog(sys.argv[1] if len(sys.argv) > 1 else None)
+    catalog.refresh()
+    table = [["Run", "Scenario", "Complete", "Rows", "Actors", "Time [s]", "Source"]]
+    for run_id in catalog.select(empty=True):
+        entry = catalog.runs[run_id]
+        time_range = entry['time'] or [0.0, 0.0]
+        table.append([run_id, entry['scenario'], entry['complete'], entry['rows'], len(entry['actors']),
+                      f'{time_range[0]:.2f} - {time_range[1]:.2f}', entry['source']])
+    print(tabulate(table, headers="firstrow", disable_numparse=True))
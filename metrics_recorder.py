@@ -0,0 +1,113 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = ['actor_type', 'sumo_id', 'velocity', 'travelled_distance', 'throttle', 'steer', 'brake', 'acceleration',
+           'acc_x', 'acc_y', 'loc_x', 'loc_y', 'heading', 'time_step', 'time']
+NUMERIC_COLUMNS = COLUMNS[2:]
+
+
+def log_filepath(path: str = None, extension: str = 'csv') -> str:
+    if path is None:
+        path = os.getcwd()
+    path = os.path.join(path, 'logs')
+    if not os.path.exists(path):
+        os.mkdir(path)
+    return os.path.join(path, f'logged_metrics_{time.time()}.{extension}')
+
+
+class MetricsRecorder:
+    """
+    Columnar per-tick actor metrics. Rows go into NumPy buffers that grow by chunk_size rows,
+    travelled distance and time are kept per actor, and the DataFrame is only built on demand.
+    With a sink (see metrics_sink) the buffered rows are written out every flush_every ticks,
+    so memory stays bounded to one flush interval.
+    """
+
+    def __init__(self, chunk_size: int = 4096, sink=None, flush_every: int = 100, scenario: str = None):
+        self.chunk_size = chunk_size
+        self.sink = sink
+        self.flush_every = flush_every
+        self.scenario = scenario
+        self.size = 0
+        self.ticks = 0
+        self.flushed_rows = 0
+        self.batches = 0
+        self.actor_codes = np.empty(chunk_size, dtype=np.int32)
+        self.columns = {col: np.empty(chunk_size) for col in NUMERIC_COLUMNS}
+        # per actor: code, travelled distance, time of the last row
+        self.actors = {}
+        self.actor_types = []
+        self.sumo_ids = []
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        self.actor_codes = np.concatenate([self.actor_codes, np.empty(self.chunk_size, dtype=np.int32)])
+        for col, buffer in self.columns.items():
+            self.columns[col] = np.concatenate([buffer, np.empty(self.chunk_size)])
+
+    def record(self, actor_type: str, sumo_id: str, velocity: float, throttle: float, steer: float, brake: float,
+               acc_x: float, acc_y: float, loc_x: float, loc_y: float, heading: float, time_step: float) -> None:
+        state = self.actors.get(sumo_id)
+        if state is None:
+            code = len(self.actor_types)
+            self.actor_types.append(actor_type)
+            self.sumo_ids.append(sumo_id)
+            travelled_dis = velocity * time_step
+            time_val = 0.0
+        else:
+            code, travelled_dis, time_val = state
+            travelled_dis += velocity * time_step
+            time_val += time_step
+        self.actors[sumo_id] = (code, travelled_dis, time_val)
+
+        if self.size == len(self.actor_codes):
+            self._grow()
+        row = self.size
+        self.actor_codes[row] = code
+        values = (velocity, travelled_dis, throttle, steer, brake, (acc_x ** 2 + acc_y ** 2) ** (1 / 2), acc_x, acc_y,
+                  loc_x, loc_y, heading, time_step, time_val)
+        for col, value in zip(NUMERIC_COLUMNS, values):
+            self.columns[col][row] = value
+        self.size += 1
+
+    def to_dataframe(self) -> pd.DataFrame:
+        codes = self.actor_codes[:self.size]
+        data = {'actor_type': np.array(self.actor_types, dtype=object)[codes],
+                'sumo_id': np.array(self.sumo_ids, dtype=object)[codes]}
+        data.update({col: self.columns[col][:self.size] for col in NUMERIC_COLUMNS})
+        return pd.DataFrame(data, columns=COLUMNS)
+
+    def to_csv(self, filepath: str) -> None:
+        self.to_dataframe().to_csv(filepath, index=False)
+
+    def tick(self) -> None:
+        self.ticks += 1
+        if self.sink is not None and self.flush_every and self.ticks % self.flush_every == 0:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.sink is None or self.size == 0:
+            return
+        self.sink.write(self.to_dataframe())
+        self.flushed_rows += self.size
+        self.batches += 1
+        self.size = 0
+
+    def close(self) -> None:
+        if self.sink is None:
+            return
+        self.flush()
+        self.sink.close({
+            'scenario': self.scenario,
+            'columns': COLUMNS,
+            'rows': self.flushed_rows,
+            'batches': self.batches,
+            'ticks': self.ticks,
+            'actors': dict(zip(self.sumo_ids, self.actor_types)),
+        })
+        self.sink = None
@@ -0,0 +1,134 @@
+import json
+import os
+
+import pandas as pd
+
+from metrics_recorder import COLUMNS, log_filepath
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+FORMATS = ('arrow', 'parquet', 'csv')
+
+
+# The sinks only create their file on the first write, so a run that dies before its first flush
+# (e.g. CARLA not reachable) leaves no empty log behind, and close() writes no manifest for it.
+class CsvSink:
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.file = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        header = self.file is None
+        if header:
+            self.file = open(self.filepath, 'w', newline='')
+        df.to_csv(self.file, index=False, header=header)
+        self.file.flush()
+
+    def close(self, manifest: dict = None) -> None:
+        if self.file is None:
+            return
+        self.file.close()
+        write_manifest(self.filepath, manifest)
+
+
+class ArrowSink:
+    # Arrow IPC stream: every flushed batch stays readable even if the run dies before close()
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.file = None
+        self.writer = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        batch = pa.RecordBatch.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            self.file = pa.OSFile(self.filepath, 'wb')
+            self.writer = ipc.new_stream(self.file, batch.schema)
+        self.writer.write_batch(batch)
+        self.file.flush()
+
+    def close(self, manifest: dict = None) -> None:
+        if self.writer is None:
+            return
+        self.writer.close()
+        self.file.close()
+        write_manifest(self.filepath, manifest)
+
+
+class ParquetSink:
+    # One row group per flush, the footer is only written by close()
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self.writer = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.filepath, table.schema)
+        self.writer.write_table(table)
+
+    def close(self, manifest: dict = None) -> None:
+        if self.writer is None:
+            return
+        self.writer.close()
+        write_manifest(self.filepath, manifest)
+
+
+def open_sink(path: str = None, fmt: str = 'arrow'):
+    """Sink for logs/logged_metrics_<time>.<fmt>; falls back to CSV when pyarrow is not installed."""
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown metrics format {fmt}, expected one of {FORMATS}')
+    if pa is None:
+        fmt = 'csv'
+    filepath = log_filepath(path, fmt)
+    if fmt == 'arrow':
+        return ArrowSink(filepath)
+    if fmt == 'parquet':
+        return ParquetSink(filepath)
+    return CsvSink(filepath)
+
+
+def manifest_path(filepath: str) -> str:
+    return f'{filepath}.manifest.json'
+
+
+def write_manifest(filepath: str, manifest: dict) -> None:
+    if manifest is None:
+        return
+    manifest = dict(manifest, format=filepath.rsplit('.', 1)[-1], complete=True)
+    with open(manifest_path(filepath), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def read_manifest(filepath: str) -> dict:
+    # A missing manifest means the run did not shut down cleanly
+    if not os.path.exists(manifest_path(filepath)):
+        return None
+    with open(manifest_path(filepath)) as f:
+        return json.load(f)
+
+
+def read_metrics(filepath: str) -> pd.DataFrame:
+    # zero-byte logs of older runs that died before their first flush
+    if os.path.getsize(filepath) == 0:
+        return pd.DataFrame(columns=COLUMNS)
+    if filepath.endswith('.arrow'):
+        if pa is None:
+            raise ImportError(f'pyarrow is required to read {filepath}')
+        batches = []
+        with pa.OSFile(filepath, 'rb') as f:
+            reader = ipc.open_stream(f)
+            try:
+                for batch in reader:
+                    batches.append(batch)
+            except pa.ArrowInvalid:
+                # truncated by a crash, keep the batches that were fully flushed
+                pass
+            return pa.Table.from_batches(batches, schema=reader.schema).to_pandas()
+    if filepath.endswith('.parquet'):
+        return pd.read_parquet(filepath)
+    return pd.read_csv(filepath)
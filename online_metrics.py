@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+from comparison_engine import cost_function
+from dtw_engine import dtw, sakoe_chiba_window
+from phase_engine import cross_correlation_lag
+
+CHANNELS = ('speed', 'heading', 'x', 'y')
+
+
+def load_reference(path: str) -> tuple:
+    """Time base and channels of a reference trace in the sumo_logged.csv layout (SUMO frame)."""
+    reference = pd.read_csv(path)
+    return reference.time.values, {channel: reference[channel].values for channel in CHANNELS}
+
+
+class OnlineMetrics:
+    """
+    Similarity of a running simulation to a reference trace, updated every tick.
+    - magnitude_<channel>: running sum|live - ref| / sum|ref| over the whole run
+    - lag_<channel>: cross-correlation lag (n*) over the last `window` ticks
+    - dtw_<channel>: Sakoe-Chiba banded DTW distance over the last `window` ticks
+    The windowed metrics are refreshed for one channel every `every` ticks, so the per-tick cost
+    and the memory stay bounded by the window. Metrics listed in thresholds are checked on
+    every update against the absolute limit, but only after `warmup` samples (default: one window).
+    A magnitude is only reported once sum|ref| of its channel reaches min_reference, the ratio
+    is meaningless while the reference is still close to zero (e.g. the ego standing at the start).
+    """
+
+    def __init__(self, reference_time, reference: dict, window: int = 100, radius: int = 10, every: int = 10,
+                 thresholds: dict = None, warmup: int = None, min_reference: float = 10.0):
+        self.reference_time = np.asarray(reference_time, dtype=float)
+        self.reference = np.array([reference[channel] for channel in CHANNELS], dtype=float)
+        self.window = window
+        self.every = every
+        self.thresholds = dict(thresholds or {})
+        self.warmup = window if warmup is None else warmup
+        self.min_reference = min_reference
+        self.band = sakoe_chiba_window(window, window, radius)
+        self.live = np.zeros((len(CHANNELS), window))
+        self.expected = np.zeros((len(CHANNELS), window))
+        self.abs_diff = np.zeros(len(CHANNELS))
+        self.abs_ref = np.zeros(len(CHANNELS))
+        self.count = 0
+        self.time = None
+        self.values = {}
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs):
+        return cls(*load_reference(path), **kwargs)
+
+    def update(self, time_step: float, speed: float, heading: float, x: float, y: float) -> list:
+        """Add one live sample (SUMO frame) and return the names of the metrics above their threshold."""
+        # same clock as MetricsRecorder: the first sample is at 0
+        self.time = 0.0 if self.time is None else self.time + time_step
+        if not self.reference_time[0] <= self.time <= self.reference_time[-1]:
+            return self.exceeded()
+
+        idx = min(max(int(np.searchsorted(self.reference_time, self.time, side='right')), 1), len(self.reference_time) - 1)
+        t_lo, t_hi = self.reference_time[idx - 1], self.reference_time[idx]
+        weight = (self.time - t_lo) / (t_hi - t_lo) if t_hi > t_lo else 0.0
+        expected = self.reference[:, idx - 1] + (self.reference[:, idx] - self.reference[:, idx - 1]) * weight
+        sample = np.array([speed, heading, x, y], dtype=float)
+
+        slot = self.count % self.window
+        self.live[:, slot] = sample
+        self.expected[:, slot] = expected
+        self.count += 1
+
+        self.abs_diff += np.abs(sample - expected)
+        self.abs_ref += np.abs(expected)
+        for c in np.flatnonzero(self.abs_ref >= self.min_reference):
+            self.values[f'magnitude_{CHANNELS[c]}'] = float(self.abs_diff[c] / self.abs_ref[c])
+
+        if self.count >= self.window and self.count % self.every == 0:
+            self._update_window((self.count // self.every) % len(CHANNELS))
+        return self.exceeded()
+
+    def _update_window(self, c: int) -> None:
+        # ring buffer in time order, oldest sample first
+        order = (np.arange(self.window) + self.count) % self.window
+        live, expected = self.live[c, order], self.expected[c, order]
+        # without the window means the offset of the signals would dominate the correlation
+        self.values[f'lag_{CHANNELS[c]}'] = cross_correlation_lag(live - live.mean(), expected - expected.mean())
+        self.values[f'dtw_{CHANNELS[c]}'] = float(dtw(live, expected, cost_function, window=self.band,
+                                                      return_path=False))
+
+    def exceeded(self) -> list:
+        if self.count < self.warmup:
+            return []
+        return [name for name, limit in self.thresholds.items() if abs(self.values.get(name, 0.0)) > limit]
+
+    def summary(self) -> str:
+        return ', '.join(f'{name}={value:.3g}' for name, value in sorted(self.values.items()))
@@ -0,0 +1,28 @@
+import numpy as np
+from scipy.signal import correlate, correlation_lags
+
+
+def cross_correlation_lag(speed1, speed2) -> int:
+    # shift that yields maximum cross-correlation, computed with FFT
+    cross_correlation = correlate(speed1, speed2, method='fft')
+    lags = correlation_lags(len(speed1), len(speed2))
+    return int(lags[np.argmax(cross_correlation)])
+
+
+def phase_error_grid(n_star: int, c_range, r_range) -> np.ndarray:
+    # exp((n* - c) / r) for every (c, r) pair, c along the rows
+    c = np.asarray(c_range, dtype=float)[:, None]
+    r = np.asarray(r_range, dtype=float)[None, :]
+    with np.errstate(over='ignore'):
+        return np.exp((n_star - c) / r)
+
+
+def best_phase_error(speed1, speed2, c_range, r_range) -> tuple:
+    """
+    Lag n* between the two signals and the (c, r) pair of the grid with the smallest phase error.
+    Returns (c, r, n*, phase error); ties resolve to the first c, then the first r, like a row-major search.
+    """
+    n_star = cross_correlation_lag(speed1, speed2)
+    errors = phase_error_grid(n_star, c_range, r_range)
+    c_idx, r_idx = np.unravel_index(np.argmin(errors), errors.shape)
+    return c_range[c_idx], r_range[r_idx], n_star, errors[c_idx, r_idx]
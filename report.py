@@ -0,0 +1,113 @@
+import html
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs
+from plotly.offline.offline import get_plotlyjs_version
+from plotly.subplots import make_subplots
+
+MAX_POINTS = 2000
+TIME_SERIES = ('velocity', 'travelled_distance', 'acceleration', 'throttle', 'steer', 'brake', 'heading')
+
+
+def minmax_indices(channels: list, max_points: int = MAX_POINTS) -> np.ndarray:
+    """
+    Sorted row indices that keep the first and last sample and, for every channel, the minimum and
+    maximum of each bucket, so peaks survive the downsampling. At most about max_points rows are kept.
+    """
+    n = len(channels[0])
+    if n <= max_points:
+        return np.arange(n)
+    buckets = max(1, max_points // (2 * len(channels)))
+    size = -(-n // buckets)
+    pad = buckets * size - n
+    offsets = np.arange(buckets) * size
+    keep = [np.array([0, n - 1])]
+    for values in channels:
+        values = np.asarray(values, dtype=float)
+        keep.append(offsets + np.concatenate([values, np.full(pad, np.inf)]).reshape(buckets, size).argmin(axis=1))
+        keep.append(offsets + np.concatenate([values, np.full(pad, -np.inf)]).reshape(buckets, size).argmax(axis=1))
+    indices = np.unique(np.concatenate(keep))
+    return indices[indices < n]
+
+
+def decimate(df: pd.DataFrame, columns: list, max_points: int = MAX_POINTS) -> pd.DataFrame:
+    return df.iloc[minmax_indices([df[col].to_numpy() for col in columns], max_points)]
+
+
+def figure_div(spec: tuple) -> str:
+    """
+    <div> of one section: trajectory plus one time series per column, without plotly.js.
+    spec is (title, df, time_column, columns, (x_column, y_column)); df should already be decimated.
+    """
+    title, df, time_column, columns, (x_column, y_column) = spec
+    fig = make_subplots(rows=len(columns) + 1, cols=1, subplot_titles=['Trajectory', *columns],
+                        vertical_spacing=0.3 / (len(columns) + 1))
+    fig.add_trace(go.Scattergl(x=df[x_column], y=df[y_column], mode='lines', name='trajectory'), row=1, col=1)
+    for row, col in enumerate(columns, start=2):
+        fig.add_trace(go.Scattergl(x=df[time_column], y=df[col], mode='lines', name=col), row=row, col=1)
+    fig.update_layout(title=title, height=280 * (len(columns) + 1), showlegend=False)
+    return fig.to_html(full_html=False, include_plotlyjs=False)
+
+
+def render_sections(specs: list, max_points: int = MAX_POINTS, processes: int = None) -> list:
+    """Decimate every section in this process, then build the plot <div>s in parallel."""
+    decimated = []
+    for title, df, time_column, columns, trajectory in specs:
+        # the trajectory keeps its x/y extremes, every time series its own min/max
+        rows = np.union1d(minmax_indices([df[col].to_numpy() for col in trajectory], max_points),
+                          minmax_indices([df[col].to_numpy() for col in columns], max_points))
+        decimated.append((title, df.iloc[rows], time_column, columns, trajectory))
+    if processes == 1 or len(decimated) <= 1:
+        return [figure_div(spec) for spec in decimated]
+    with ProcessPoolExecutor(processes) as pool:
+        return list(pool.map(figure_div, decimated))
+
+
+def write_report(path: str, title: str, sections: list, plotlyjs: str = 'inline') -> None:
+    """
+    One HTML file holding every (heading, div) section and a single copy of plotly.js:
+    'inline' embeds it, 'cdn' links the matching plotly.js release, anything else is used as the script src.
+    """
+    if plotlyjs == 'inline':
+        script = f'<script type="text/javascript">{get_plotlyjs()}</script>'
+    elif plotlyjs == 'cdn':
+        script = f'<script src="https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"></script>'
+    else:
+        script = f'<script src="{html.escape(plotlyjs)}"></script>'
+    toc = ''.join(f'<li><a href="#section{idx}">{html.escape(heading)}</a></li>'
+                  for idx, (heading, _) in enumerate(sections))
+    body = ''.join(f'<h2 id="section{idx}">{html.escape(heading)}</h2>{div}'
+                   for idx, (heading, div) in enumerate(sections))
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{html.escape(title)}</title>{script}'
+                f'</head><body><h1>{html.escape(title)}</h1><ul>{toc}</ul>{body}</body></html>')
+
+
+def metrics_report(df: pd.DataFrame, path: str, title: str = 'Logged metrics', columns: tuple = TIME_SERIES,
+                   plotlyjs: str = 'inline', processes: int = None) -> None:
+    """Report of a MetricsRecorder log with one section per actor type."""
+    time_column = 'time' if 'time' in df else 'time_step'
+    columns = [col for col in columns if col in df]
+    actor_types = list(dict.fromkeys(df['actor_type']))
+    specs = [(actor_type, df[df['actor_type'] == actor_type], time_column, columns, ('loc_x', 'loc_y'))
+             for actor_type in actor_types]
+    write_report(path, title, list(zip(actor_types, render_sections(specs, processes=processes))), plotlyjs)
+
+
+if __name__ == '__main__':
+    from log_catalog import LogCatalog
+
+    catalog = LogCatalog(sys.argv[1] if len(sys.argv) > 1 else None)
+    catalog.refresh()
+    run_id = catalog.latest()
+    if run_id is None:
+        sys.exit(f'No logged run found at {catalog.logs_dir}')
+    metrics_report(catalog.read(run_id), os.path.join('figs', f'report_{run_id}.html'), title=f'Run {run_id}')
@@ -0,0 +1,94 @@
+import numpy as np
+import sumolib
+from scipy.spatial import cKDTree
+
+
+class RoadIndex:
+    """
+    In-process replacement for traci.simulation.convertRoad built once from the SUMO net.
+    Lane shapes are split into segments indexed by a KD-tree over their midpoints. Queries first try the
+    edge of the previous answer and its neighbours, which is only accepted when the point lies strictly
+    inside a lane there, then the whole net, and only fall back to traci when the point is not on any lane.
+    So the previous answer can not pull a point onto a neighbouring lane it is not inside of.
+    """
+
+    def __init__(self, net_file: str, fallback=None, tolerance: float = 0.5):
+        net = sumolib.net.readNet(net_file)
+        self.fallback = fallback
+        self.tolerance = tolerance
+        self.lanes = []
+        starts, ends, offsets, lane_of_seg, half_widths = [], [], [], [], []
+        edge_segments = {}
+        n_segments = 0
+        for edge in net.getEdges():
+            seg_ids = []
+            for lane in edge.getLanes():
+                shape = np.asarray(lane.getShape(), dtype=float)[:, :2]
+                lengths = np.hypot(*(shape[1:] - shape[:-1]).T)
+                lane_idx = len(self.lanes)
+                self.lanes.append((edge.getID(), lane.getIndex()))
+                starts.append(shape[:-1])
+                ends.append(shape[1:])
+                offsets.append(np.concatenate([[0.0], np.cumsum(lengths)[:-1]]))
+                lane_of_seg.append(np.full(len(lengths), lane_idx))
+                half_widths.append(np.full(len(lengths), lane.getWidth() / 2))
+                seg_ids.extend(range(n_segments, n_segments + len(lengths)))
+                n_segments += len(lengths)
+            edge_segments[edge.getID()] = seg_ids
+
+        self.starts = np.concatenate(starts)
+        self.ends = np.concatenate(ends)
+        self.offsets = np.concatenate(offsets)
+        self.lane_of_seg = np.concatenate(lane_of_seg)
+        self.half_widths = np.concatenate(half_widths)
+        midpoints = (self.starts + self.ends) / 2
+        self.search_radius = np.hypot(*(self.ends - self.starts).T).max() / 2 + self.half_widths.max() + tolerance
+        self.tree = cKDTree(midpoints)
+
+        # segments of every edge together with its incoming and outgoing neighbours
+        self.hint_segments = {}
+        for edge in net.getEdges():
+            neighbours = [edge, *edge.getOutgoing().keys(), *edge.getIncoming().keys()]
+            seg_ids = [seg for e in neighbours for seg in edge_segments.get(e.getID(), [])]
+            self.hint_segments[edge.getID()] = np.array(seg_ids, dtype=int)
+
+        self.last_edge = None
+        self.hits = 0
+        self.misses = 0
+
+    def _nearest(self, x: float, y: float, seg_ids):
+        start, end = self.starts[seg_ids], self.ends[seg_ids]
+        direction = end - start
+        length_sq = np.maximum((direction ** 2).sum(axis=1), 1e-12)
+        t = np.clip(((np.array([x, y]) - start) * direction).sum(axis=1) / length_sq, 0.0, 1.0)
+        closest = start + t[:, None] * direction
+        dist = np.hypot(closest[:, 0] - x, closest[:, 1] - y)
+        best = np.argmin(dist)
+        seg = seg_ids[best]
+        if dist[best] > self.half_widths[seg] + self.tolerance:
+            return None
+        return seg, self.offsets[seg] + t[best] * np.sqrt(length_sq[best]), dist[best] <= self.half_widths[seg]
+
+    def convert_road(self, x: float, y: float) -> tuple:
+        """Same (edgeID, pos, laneIndex) tuple as traci.simulation.convertRoad."""
+        found = None
+        if self.last_edge is not None:
+            found = self._nearest(x, y, self.hint_segments[self.last_edge])
+            # within the tolerance band a lane of another edge (e.g. the opposite carriageway) may be closer
+            if found is not None and not found[2]:
+                found = None
+        if found is None:
+            candidates = np.array(self.tree.query_ball_point((x, y), self.search_radius), dtype=int)
+            if len(candidates):
+                found = self._nearest(x, y, candidates)
+        if found is None:
+            self.misses += 1
+            if self.fallback is None:
+                raise ValueError(f'No lane found at ({x}, {y})')
+            return self.fallback(x, y)
+
+        self.hits += 1
+        seg, pos, _ = found
+        edge_id, lane_index = self.lanes[self.lane_of_seg[seg]]
+        self.last_edge = edge_id
+        return edge_id, float(pos), lane_index
@@ -1,71 +1,139 @@
+import json
+import os
+
+from control_schedule import parse_schedule
+from coord_transform import carla_to_sumo
+
+SCENARIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scenarios')
+ACTOR_FIELDS = {'pos': 3, 'rot': 3, 'destination_pos': 3, 'control': 3}
+
+_cache = {}
+
+
 class Actor:
-    sumo_index = 0
+    __slots__ = ('pos', 'destination_pos', 'rot', 'type', 'sumo_id', 'control', 'sensor', 'sens_rel_loc')
 
     def __init__(self, pos: tuple, rot: tuple, destionation_pos: tuple, type: str, control: tuple, sensor: bool = False,
-                 sens_rel_loc: tuple = None):
+                 sens_rel_loc: tuple = None, sumo_id: str = None):
         self.pos = pos
         self.destination_pos = destionation_pos
         self.rot = rot
         self.type = type
-        self.sumo_id = f'vehicle{Actor.sumo_index}'
-        Actor.sumo_index += 1
+        self.sumo_id = sumo_id
         self.control = control
         self.sensor = sensor
         self.sens_rel_loc = sens_rel_loc
 
     def __str__(self):
-        print(
+        return (
             f'Actor type: {self.type}\n '
             f'Actor position: x:{self.pos[0]},y:{self.pos[1]},z:{self.pos[2]}\n '
             f'Actor rotation: pitch:{self.rot[0]},yaw:{self.rot[1]},roll:{self.rot[2]}\n '
             f'Actor control: throttle:{self.control[0]},steer:{self.control[1]},brake:{self.control[2]}')
 
 
-class ScenarioDescription:
-    ego_actor = Actor(
-        (-426.5, 30.4, 0.5),
-        (0, 0, 0),
-        (-438.57, 10.17, -0.00),
-        'vehicle.mercedes.coupe_2020',
-        (1.0, 0.0, 0.0),
-        sensor=True,
-        sens_rel_loc=(-5.7, 0, 3.7))
-    other_actors = [
-        Actor(
-            (-426.4, 26.9, 0.5),
-            (0, 0, 0),
-            (-326.72, 26.91, 0.22),
-            'vehicle.audi.a2',
-            (0.6, 0.0, 0.0)),
-        Actor(
-            (-447.2, 37.4, 0.5),
-            (0, 0, 0),
-            (-220.10, 37.37, 3.68),
-            'vehicle.tesla.model3',
-            (1.0, 0.0, 0.0)),
-        Actor(
-            (-298.2, 5.4, 3),
-            (0, 180, 0),
-            (-446.78, 6.99, -0.02),
-            'vehicle.audi.etron',
-            (1.0, 0.0, 0.0)),
-        Actor(
-            (-315.9, 12.7, 3),
-            (0, 180, 0),
-            (-464.65, 14.54, -0.01),
-            'vehicle.tesla.cybertruck',
-            (1.0, 0.0, 0.0)),
-        Actor(
-            (-337.7, 16.1, 3),
-            (0, 180, 0),
-            (-470.86, 17.06, -0.03),
-            'vehicle.dodge.charger_police',
-            (1.0, 0.0, 0.0)),
-    ]
-    all_actor = [ego_actor]
-    all_actor.extend(other_actors)
+class Scenario:
+    __slots__ = ('name', 'ego_actor', 'other_actors', 'all_actor', 'control_schedules')
+
+    def __init__(self, name: str, ego_actor: Actor, other_actors: list, control_schedules: dict = None):
+        self.name = name
+        self.ego_actor = ego_actor
+        self.other_actors = other_actors
+        self.all_actor = [ego_actor, *other_actors]
+        # breakpoint tuples by simulation script, see control_schedule.ControlSchedule
+        self.control_schedules = control_schedules or {}
+        # ids only depend on the position of the actor in its scenario
+        for index, actor in enumerate(self.all_actor):
+            if actor.sumo_id is None:
+                actor.sumo_id = f'vehicle{index}'
+
+
+def _read_file(path: str):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.json':
+        with open(path) as f:
+            return json.load(f)
+    if extension == '.toml':
+        import tomllib
+
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    if extension in ('.yaml', '.yml'):
+        import yaml
+
+        with open(path) as f:
+            return yaml.safe_load(f)
+    raise ValueError(f'Unsupported scenario format {extension} ({path})')
+
+
+def _parse_actor(data: dict, where: str) -> Actor:
+    if not isinstance(data, dict):
+        raise ValueError(f'{where}: expected a mapping, got {type(data).__name__}')
+    if not isinstance(data.get('type'), str):
+        raise ValueError(f'{where}: missing actor type')
+    values = {}
+    for field, length in ACTOR_FIELDS.items():
+        value = data.get(field)
+        if not isinstance(value, (list, tuple)) or len(value) != length:
+            raise ValueError(f'{where}: {field} must be a list of {length} numbers')
+        values[field] = tuple(map(float, value))
+    sens_rel_loc = data.get('sens_rel_loc')
+    if sens_rel_loc is not None:
+        if not isinstance(sens_rel_loc, (list, tuple)) or len(sens_rel_loc) != 3:
+            raise ValueError(f'{where}: sens_rel_loc must be a list of 3 numbers')
+        sens_rel_loc = tuple(map(float, sens_rel_loc))
+    return Actor(values['pos'], values['rot'], values['destination_pos'], data['type'], values['control'],
+                 sensor=bool(data.get('sensor', False)), sens_rel_loc=sens_rel_loc, sumo_id=data.get('sumo_id'))
+
+
+def _parse_scenario(data: dict, where: str) -> Scenario:
+    if not isinstance(data, dict) or 'ego_actor' not in data:
+        raise ValueError(f'{where}: a scenario needs an ego_actor')
+    ego_actor = _parse_actor(data['ego_actor'], f'{where}.ego_actor')
+    other_actors = [_parse_actor(actor, f'{where}.other_actors[{idx}]')
+                    for idx, actor in enumerate(data.get('other_actors', []))]
+    scenario = Scenario(data.get('name', where), ego_actor, other_actors)
+    sumo_ids = [actor.sumo_id for actor in scenario.all_actor]
+    if len(set(sumo_ids)) != len(sumo_ids):
+        raise ValueError(f'{where}: duplicate sumo_id in {sumo_ids}')
+    schedules = data.get('control_schedules', {})
+    if not isinstance(schedules, dict):
+        raise ValueError(f'{where}: control_schedules must map a name to a list of breakpoints')
+    scenario.control_schedules = {name: parse_schedule(items, f'{where}.control_schedules.{name}', sumo_ids)
+                                  for name, items in schedules.items()}
+    return scenario
+
+
+def load_scenarios(path: str) -> list:
+    """
+    Scenarios of a JSON, TOML or YAML file holding either one scenario or a 'scenarios' list.
+    Parsed files are cached until their modification time changes.
+    """
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    data = _read_file(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    if isinstance(data, dict) and 'scenarios' in data:
+        scenarios = [_parse_scenario(item, f'{name}[{idx}]') for idx, item in enumerate(data['scenarios'])]
+    else:
+        scenarios = [_parse_scenario(data, name)]
+    _cache[path] = (mtime, scenarios)
+    return scenarios
+
+
+def load_scenario(path: str) -> Scenario:
+    scenarios = load_scenarios(path)
+    if len(scenarios) != 1:
+        raise ValueError(f'{path} holds {len(scenarios)} scenarios, use load_scenarios')
+    return scenarios[0]
+
+
+ScenarioDescription = load_scenario(os.path.join(SCENARIO_DIR, 'u_turn.json'))
 
 
 def conv2sumoLoc(loc: tuple) -> tuple:
-    sumo_loc = (loc[0] + 503.02, -loc[1] + 423.76)
+    sumo_loc = tuple(float(v) for v in carla_to_sumo(loc[0], loc[1]))
     return sumo_loc
@@ -0,0 +1,98 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from coord_transform import carla_to_sumo, carla_yaw_to_sumo_angle
+
+INPUT_FILES = {
+    'carla_heading': 'ego_heading_carla.csv',
+    'carla_speed': 'ego_speed_carla.csv',
+    'carla_traj': 'ego_trajec_carla.csv',
+    'sumo': 'sumo_logged.csv',
+    'cosim': 'cosim_log.csv',
+}
+CARLA_TIMESTEP = 0.23
+CACHE_DIR = '.alignment_cache'
+# bump when the aligned content changes so old cache files are not reused
+CACHE_VERSION = 1
+
+
+def resample(source_time, channels, target_time) -> np.ndarray:
+    """Linear interpolation of every row of channels onto target_time, sharing one index search."""
+    source_time = np.asarray(source_time, dtype=float)
+    target_time = np.asarray(target_time, dtype=float)
+    channels = np.atleast_2d(np.asarray(channels, dtype=float))
+    if target_time.min() < source_time[0] or target_time.max() > source_time[-1]:
+        raise ValueError('target_time is outside of the source time range')
+    idx = np.clip(np.searchsorted(source_time, target_time, side='right') - 1, 0, len(source_time) - 2)
+    t_lo, t_hi = source_time[idx], source_time[idx + 1]
+    y_lo, y_hi = channels[:, idx], channels[:, idx + 1]
+    return y_lo + (y_hi - y_lo) / (t_hi - t_lo) * (target_time - t_lo)
+
+
+def _input_digest(directory: str) -> str:
+    digest = hashlib.sha1(f'{CACHE_VERSION}:{CARLA_TIMESTEP}'.encode())
+    for name in INPUT_FILES.values():
+        with open(os.path.join(directory, name), 'rb') as f:
+            digest.update(hashlib.sha1(f.read()).digest())
+    return digest.hexdigest()
+
+
+def align_signals(directory: str = '.') -> dict:
+    """Load the CARLA, SUMO and co-simulation logs once and resample all channels onto the SUMO time base."""
+    logs = {key: pd.read_csv(os.path.join(directory, name)) for key, name in INPUT_FILES.items()}
+    sumo, cosim = logs['sumo'], logs['cosim']
+
+    carla_x, carla_y = carla_to_sumo(logs['carla_traj'].loc_x.values, logs['carla_traj'].loc_y.values)
+    cosim_x, cosim_y = carla_to_sumo(cosim.loc_x.values, cosim.loc_y.values)
+
+    # Create time arrays for Carla and SUMO data
+    carla_time = np.arange(0, len(logs['carla_speed']) * CARLA_TIMESTEP, CARLA_TIMESTEP)
+    sumo_time = sumo.time.values
+    cosim_time = np.linspace(carla_time[0], carla_time[-1], len(cosim))
+
+    # speed, heading, x and y of each source in one pass
+    carla = resample(carla_time, [logs['carla_speed'].velocity.values,
+                                  carla_yaw_to_sumo_angle(logs['carla_heading'].heading.values),
+                                  carla_x, carla_y], sumo_time)
+    cosim_channels = resample(cosim_time, [cosim.velocity.values, carla_yaw_to_sumo_angle(cosim.heading.values),
+                                           cosim_x, cosim_y], sumo_time)
+
+    return {
+        'sumo_time': sumo_time,
+        'sumo_speed': sumo.speed.values,
+        'sumo_heading': sumo.heading.values,
+        'sumo_x': sumo.x.values,
+        'sumo_y': sumo.y.values,
+        'carla_x': carla_x,
+        'carla_y': carla_y,
+        'cosim_x': cosim_x,
+        'cosim_y': cosim_y,
+        'interpolated_carla_speed': carla[0],
+        'interpolated_carla_heading': carla[1],
+        'interpolated_carla_x': carla[2],
+        'interpolated_carla_y': carla[3],
+        'interpolated_cosim_speed': cosim_channels[0],
+        'interpolated_cosim_heading': cosim_channels[1],
+        'interpolated_cosim_x': cosim_channels[2],
+        'interpolated_cosim_y': cosim_channels[3],
+    }
+
+
+def load_aligned(directory: str = '.', use_cache: bool = True) -> dict:
+    """
+    align_signals() backed by an npz cache keyed by the hashes of the input files,
+    so repeated analysis runs skip CSV parsing and interpolation.
+    """
+    if not use_cache:
+        return align_signals(directory)
+    cache_file = os.path.join(directory, CACHE_DIR, f'aligned_{_input_digest(directory)}.npz')
+    if os.path.exists(cache_file):
+        with np.load(cache_file) as cached:
+            return {key: cached[key] for key in cached.files}
+    aligned = align_signals(directory)
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    np.savez(cache_file, **aligned)
+    return aligned
@@ -0,0 +1,126 @@
+import math
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+class SimulatorBackend(ABC):
+    """
+    Simulator-agnostic interface used by the batch runner. Actors are addressed by the handle returned
+    from spawn(); read_states() returns one dict per actor with the fields of MetricsRecorder.record.
+    """
+
+    @abstractmethod
+    def spawn(self, actor) -> int:
+        pass
+
+    @abstractmethod
+    def tick(self) -> float:
+        pass
+
+    @abstractmethod
+    def read_states(self) -> list:
+        pass
+
+    @abstractmethod
+    def apply_control(self, handle: int, throttle: float = 0.0, steer: float = 0.0, brake: float = 0.0) -> None:
+        pass
+
+    @abstractmethod
+    def set_transform(self, handle: int, x: float, y: float, yaw: float) -> None:
+        pass
+
+    @abstractmethod
+    def convert_road(self, x: float, y: float) -> tuple:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class KinematicBackend(SimulatorBackend):
+    """
+    In-process stand-in simulator: every actor follows a kinematic bicycle model and all actors are advanced
+    together as one NumPy array step. Coordinates and yaw (degrees) use the CARLA frame.
+    """
+    MAX_ACCELERATION = 4.0
+    MAX_DECELERATION = 8.0
+    MAX_SPEED = 40.0
+    MAX_STEER_ANGLE = math.radians(70)
+    WHEELBASE = 2.9
+
+    def __init__(self, endpoint=None, step_length: float = 0.023, road_index=None):
+        self.endpoint = endpoint
+        self.step_length = step_length
+        self.road_index = road_index
+        self.actor_types = []
+        self.sumo_ids = []
+        self.x = np.empty(0)
+        self.y = np.empty(0)
+        self.yaw = np.empty(0)
+        self.speed = np.empty(0)
+        self.controls = np.empty((0, 3))
+        self.acc = np.empty((0, 2))
+
+    def spawn(self, actor) -> int:
+        self.actor_types.append(actor.type)
+        self.sumo_ids.append(actor.sumo_id)
+        self.x = np.append(self.x, actor.pos[0])
+        self.y = np.append(self.y, actor.pos[1])
+        self.yaw = np.append(self.yaw, math.radians(actor.rot[1]))
+        self.speed = np.append(self.speed, 0.0)
+        self.controls = np.vstack([self.controls, actor.control])
+        self.acc = np.vstack([self.acc, np.zeros(2)])
+        return len(self.sumo_ids) - 1
+
+    def tick(self) -> float:
+        dt = self.step_length
+        throttle, steer, brake = self.controls.T
+        old_velocity = np.stack([self.speed * np.cos(self.yaw), self.speed * np.sin(self.yaw)], axis=1)
+
+        accel = np.clip(throttle, 0, 1) * self.MAX_ACCELERATION - np.clip(brake, 0, 1) * self.MAX_DECELERATION
+        self.speed = np.clip(self.speed + accel * dt, 0.0, self.MAX_SPEED)
+        steer_angle = np.clip(steer, -1, 1) * self.MAX_STEER_ANGLE
+        self.yaw = self.yaw + self.speed / self.WHEELBASE * np.tan(steer_angle) * dt
+        # keep yaw in [-180, 180) degrees like CARLA
+        self.yaw = (self.yaw + np.pi) % (2 * np.pi) - np.pi
+        self.x = self.x + self.speed * np.cos(self.yaw) * dt
+        self.y = self.y + self.speed * np.sin(self.yaw) * dt
+
+        new_velocity = np.stack([self.speed * np.cos(self.yaw), self.speed * np.sin(self.yaw)], axis=1)
+        self.acc = (new_velocity - old_velocity) / dt
+        return dt
+
+    def read_states(self) -> list:
+        heading = np.degrees(self.yaw)
+        return [{'actor_type': self.actor_types[i], 'sumo_id': self.sumo_ids[i], 'velocity': self.speed[i],
+                 'throttle': self.controls[i, 0], 'steer': self.controls[i, 1], 'brake': self.controls[i, 2],
+                 'acc_x': self.acc[i, 0], 'acc_y': self.acc[i, 1], 'loc_x': self.x[i], 'loc_y': self.y[i],
+                 'heading': heading[i]}
+                for i in range(len(self.sumo_ids))]
+
+    def apply_control(self, handle: int, throttle: float = 0.0, steer: float = 0.0, brake: float = 0.0) -> None:
+        self.controls[handle] = (throttle, steer, brake)
+
+    def set_transform(self, handle: int, x: float, y: float, yaw: float) -> None:
+        self.x[handle] = x
+        self.y[handle] = y
+        self.yaw[handle] = math.radians(yaw)
+
+    def convert_road(self, x: float, y: float) -> tuple:
+        # without a road_index.RoadIndex there is no road network, every point maps to one anonymous lane
+        if self.road_index is None:
+            return '', 0.0, 0
+        return self.road_index.convert_road(x, y)
+
+
+def get_backend(name: str):
+    # the CARLA adapter is only imported when asked for, so the stand-in runs without the carla package
+    if name == 'carla':
+        from carla_backend import CarlaBackend
+        return CarlaBackend
+    return BACKENDS[name]
+
+
+BACKENDS = {'kinematic': KinematicBackend}
+BACKEND_NAMES = sorted([*BACKENDS, 'carla'])
@@ -0,0 +1,37 @@
+import carla
+import numpy as np
+import traci
+from traci import constants as tc
+
+from coord_transform import TOWN04_OFFSET, sumo_angle_to_carla_yaw, sumo_to_carla
+
+SUBSCRIBED_VARS = [tc.VAR_POSITION, tc.VAR_ANGLE, tc.VAR_SPEED, tc.VAR_ACCELERATION]
+
+
+def subscribe_vehicles(vehicle_ids: list) -> None:
+    # results are pushed by SUMO with every simulationStep instead of being polled per getter
+    for vehicle_id in vehicle_ids:
+        traci.vehicle.subscribe(vehicle_id, SUBSCRIBED_VARS)
+
+
+def sync_commands(carla_vehicles: list, vehicle_ids: list, offset: tuple = TOWN04_OFFSET) -> list:
+    """CARLA batch commands that move every SUMO-controlled vehicle to its state of the last SUMO step."""
+    results = traci.vehicle.getAllSubscriptionResults()
+    synced = [(vehicle, results[vehicle_id]) for vehicle, vehicle_id in zip(carla_vehicles, vehicle_ids)
+              if results.get(vehicle_id)]
+    if not synced:
+        return []
+    # convert the whole fleet to the CARLA frame at once
+    sumo_pos = np.array([result[tc.VAR_POSITION] for _, result in synced], dtype=float)
+    carla_x, carla_y = sumo_to_carla(sumo_pos[:, 0], sumo_pos[:, 1], offset)
+    carla_yaw = sumo_angle_to_carla_yaw([result[tc.VAR_ANGLE] for _, result in synced])
+    # Convert SUMO speed to CARLA velocity (km/h)
+    carla_speed = np.array([result[tc.VAR_SPEED] for _, result in synced], dtype=float) * 3.6
+
+    commands = []
+    for idx, (vehicle, _) in enumerate(synced):
+        transform = carla.Transform(carla.Location(float(carla_x[idx]), float(carla_y[idx]), 0),
+                                    carla.Rotation(0, float(carla_yaw[idx]), 0))
+        commands.append(carla.command.ApplyTransform(vehicle.id, transform))
+        commands.append(carla.command.ApplyTargetVelocity(vehicle.id, carla.Vector3D(float(carla_speed[idx]), 0, 0)))
+    return commands
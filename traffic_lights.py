@@ -0,0 +1,47 @@
+import carla
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+class TrafficLightController:
+    """
+    Proximity based traffic light override around the ego vehicle.
+    Lights are fetched once and indexed in a KD-tree, only lights within yellow_radius are queried per tick,
+    and set_state is only sent for lights whose state actually changes.
+    """
+
+    def __init__(self, world, green_radius: float = 45, yellow_radius: float = 55):
+        self.world = world
+        self.green_radius = green_radius
+        self.yellow_radius = yellow_radius
+        self.lights = list(world.get_actors().filter('traffic.traffic_light'))
+        locations = [light.get_location() for light in self.lights]
+        self.tree = cKDTree(np.array([[loc.x, loc.y, loc.z] for loc in locations]).reshape(-1, 3))
+        # lights keep the state we give them instead of cycling on their own timers
+        world.freeze_all_traffic_lights(True)
+        self.states = [light.get_state() for light in self.lights]
+        self.overridden = set(range(len(self.lights)))
+
+    def update(self, location) -> int:
+        """Apply the override for the ego location, returns the number of lights that changed."""
+        point = [location.x, location.y, location.z]
+        nearby = self.tree.query_ball_point(point, self.yellow_radius) if self.lights else []
+        desired = {idx: carla.TrafficLightState.Red for idx in self.overridden}
+        for idx in nearby:
+            light_dis = np.linalg.norm(self.tree.data[idx] - point)
+            if light_dis < self.green_radius:
+                desired[idx] = carla.TrafficLightState.Green
+            elif light_dis < self.yellow_radius:
+                desired[idx] = carla.TrafficLightState.Yellow
+
+        changed = 0
+        for idx, state in desired.items():
+            if self.states[idx] != state:
+                self.lights[idx].set_state(state)
+                self.states[idx] = state
+                changed += 1
+        self.overridden = {idx for idx, state in desired.items() if state != carla.TrafficLightState.Red}
+        return changed
+
+    def release(self) -> None:
+        self.world.freeze_all_traffic_lights(False)